@@ -0,0 +1,52 @@
+"""
+cold start benchmark for the vimera websockets server
+
+measures the time from spawning `python server.py` until the first connection
+is accepted and answered (a list-games round trip), for each event loop implementation
+
+usage:
+    python benchmarks/cold_start.py [--runs 10] [--loops asyncio uvloop]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from harness import spawn_server, stop_server, wait_for_server
+
+
+def time_cold_start(event_loop: str, port: int) -> float:
+    """
+    spawn a fresh server process and time how long until it answers its first request
+
+    Inputs:
+        event_loop : value for the server's EVENT_LOOP environment variable
+        port : port to run the server on
+
+    Returns:
+        seconds from process spawn to the first answered request
+    """
+    start = time.perf_counter()
+    server = spawn_server(port, event_loop)
+    try:
+        asyncio.run(wait_for_server(f"ws://127.0.0.1:{port}"))
+        return time.perf_counter() - start
+    finally:
+        stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--loops", nargs="+", default=["asyncio", "uvloop"])
+    parser.add_argument("--port", type=int, default=8101)
+    args = parser.parse_args()
+
+    for event_loop in args.loops:
+        timings = [time_cold_start(event_loop, args.port) for _ in range(args.runs)]
+        print(f"{event_loop:>8} : median {statistics.median(timings) * 1000:7.1f} ms"
+              f"  min {min(timings) * 1000:7.1f} ms  max {max(timings) * 1000:7.1f} ms  ({args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+helpers shared by the benchmark scripts for running servers, as processes or in this process,
+and for talking to them
+"""
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import websockets.client
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "vimera", "backend")
+SERVER_PATH = os.path.join(BACKEND_DIR, "server.py")
+
+LIST_GAMES = '{"type":"request","id":"harness","operation":"list-games"}'
+
+
+def spawn_server(port: int, event_loop: str = "asyncio", **extra_env) -> subprocess.Popen:
+    """
+    start `python server.py` as a separate process listening on port
+
+    Inputs:
+        port : value for the server's PORT environment variable
+        event_loop : value for the server's EVENT_LOOP environment variable
+        extra_env : any other environment variables to pass on to the server
+
+    Returns:
+        the Popen for the server, the caller is responsible for terminating it
+    """
+    env = dict(os.environ, PORT=str(port), EVENT_LOOP=event_loop, LOG_LEVEL="WARNING", **extra_env)
+    return subprocess.Popen([sys.executable, SERVER_PATH], env=env)
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    """
+    terminate a server started with spawn_server and wait for it to exit
+    """
+    server.terminate()
+    server.wait()
+
+
+async def wait_for_server(uri: str, timeout: float = 30.0) -> None:
+    """
+    keep trying to connect to uri until a list-games request gets answered
+
+    raises TimeoutError if that has not happened within timeout seconds
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            async with websockets.client.connect(uri) as websocket:
+                await websocket.send(LIST_GAMES)
+                await websocket.recv()
+                return
+        except OSError:
+            await asyncio.sleep(0.001)
+    raise TimeoutError(f"server at {uri} never accepted a connection")
+
+
+@contextlib.asynccontextmanager
+async def running_server(**server_kwargs):
+    """
+    run a VimeraWebsocketsServer inside this process on a free port, for benchmarks
+    that need to reach into the server (or its game logic) while it runs
+
+    Yields:
+        the running server, connect to f"ws://127.0.0.1:{server.port}"
+    """
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from server import VimeraWebsocketsServer
+
+    server = VimeraWebsocketsServer("127.0.0.1", 0, **server_kwargs)
+    server_task = asyncio.create_task(server.start())
+    await server.wait_until_ready()
+    try:
+        yield server
+    finally:
+        server.stop()
+        await server_task
+
+
+@contextlib.contextmanager
+def moves_to_win(server, moves: int):
+    """
+    make p1wins matches on an in-process server take `moves` moves to win while the with block runs.
+    MOVES_TO_WIN is a class attribute of P1Wins, so it is put back afterwards
+    """
+    game = server.games["p1wins"]
+    previous_moves = game.MOVES_TO_WIN
+    game.MOVES_TO_WIN = moves
+    try:
+        yield
+    finally:
+        game.MOVES_TO_WIN = previous_moves
+
+
+def request(operation: str, **params) -> str:
+    """
+    a JSON request message for operation with params
+    """
+    return json.dumps({"type": "request", "id": f"bench-{operation}", "operation": operation, "params": params})
+
+
+async def response(websocket, allow_error: bool = False) -> dict:
+    """
+    wait for the next response on a connection, skipping notifications.
+    error responses fail an assert unless allow_error
+    """
+    while True:
+        message = json.loads(await websocket.recv())
+        if message["type"] == "response":
+            assert allow_error or "error" not in message, message
+            return message
+
+
+async def notification(websocket) -> dict:
+    """
+    wait for the next notification on a connection, skipping responses
+    """
+    while True:
+        message = json.loads(await websocket.recv())
+        if message["type"] == "notification":
+            return message
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -0,0 +1,146 @@
+"""
+load generator for the vimera websockets server
+
+opens a number of concurrent client connections that each send request/response
+round trips as fast as the server answers them, and reports the throughput.
+
+with --trace, it instead replays matches recorded by src/vimera/backend/simulator.py,
+running --clients matches at a time, every player on their own connection
+
+by default it starts one server process per event loop implementation so they can be compared,
+pass --uri to point it at an already running server instead
+
+usage:
+    python benchmarks/loadgen.py [--clients 50] [--requests 200] [--loops asyncio uvloop]
+    python benchmarks/loadgen.py --uri ws://localhost:8001
+    python benchmarks/loadgen.py --trace traces.jsonl [--clients 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import websockets.client
+
+from harness import spawn_server, stop_server, wait_for_server, response
+
+
+async def _client(uri: str, client_number: int, requests: int) -> None:
+    """
+    one connection sending `requests` list-games round trips back to back
+    """
+    message = '{"type":"request","id":"loadgen-%d","operation":"list-games"}' % client_number
+    async with websockets.client.connect(uri) as websocket:
+        for _ in range(requests):
+            await websocket.send(message)
+            await websocket.recv()
+
+
+async def run_load(uri: str, clients: int, requests: int) -> float:
+    """
+    run `clients` concurrent connections against uri, each doing `requests` round trips
+
+    Returns:
+        round trips per second over the whole run
+    """
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(uri, client_number, requests) for client_number in range(clients)))
+    elapsed = time.perf_counter() - start
+    return clients * requests / elapsed
+
+
+async def _replay_match(uri: str, trace: Dict, match_number: int) -> int:
+    """
+    replay one recorded match: the first player creates it, the rest join,
+    then every recorded game-action is sent from its player's connection
+
+    Returns:
+        the number of game-actions sent
+    """
+    connections = {player: await websockets.client.connect(uri) for player in trace["players"]}
+    try:
+        creator = trace["players"][0]
+        await connections[creator].send(json.dumps({
+            "type": "request", "id": f"replay-{match_number}", "operation": "create-match",
+            "params": {"game": trace["game"], "player-name": creator}
+            }))
+        match_id = (await response(connections[creator]))["result"]["match-id"]
+
+        for player in trace["players"][1:]:
+            await connections[player].send(json.dumps({
+                "type": "request", "id": f"replay-{match_number}", "operation": "join-match",
+                "params": {"match-id": match_id, "player-name": player}
+                }))
+            await response(connections[player])
+
+        for action in trace["actions"]:
+            await connections[action["player"]].send(json.dumps({
+                "type": "request", "id": f"replay-{match_number}", "operation": "game-action",
+                "params": {"match-id": match_id, "player-name": action["player"], "action": action["action"], "data": action["data"]}
+                }))
+            # the simulator's bots make mistakes on purpose, those get error responses
+            await response(connections[action["player"]], allow_error=True)
+    finally:
+        for connection in connections.values():
+            await connection.close()
+
+    return len(trace["actions"])
+
+
+async def replay_traces(uri: str, traces: List[Dict], concurrency: int) -> float:
+    """
+    replay every trace against uri, `concurrency` matches at a time
+
+    Returns:
+        game-actions per second over the whole run
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def replay(match_number, trace):
+        async with semaphore:
+            return await _replay_match(uri, trace, match_number)
+
+    start = time.perf_counter()
+    actions = await asyncio.gather(*(replay(match_number, trace) for match_number, trace in enumerate(traces)))
+    elapsed = time.perf_counter() - start
+    return sum(actions) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=None, help="already running server to target")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--loops", nargs="+", default=["asyncio", "uvloop"])
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--trace", default=None, help="JSON lines of matches recorded by simulator.py to replay")
+    args = parser.parse_args()
+
+    if args.trace is not None:
+        with open(args.trace) as trace_file:
+            traces = [json.loads(line) for line in trace_file if line.strip()]
+        workload = lambda uri: replay_traces(uri, traces, args.clients)
+        description = f"game-actions/s  ({len(traces)} recorded matches, {args.clients} at a time)"
+    else:
+        workload = lambda uri: run_load(uri, args.clients, args.requests)
+        description = f"req/s  ({args.clients} clients x {args.requests} requests)"
+
+    if args.uri is not None:
+        throughput = asyncio.run(workload(args.uri))
+        print(f"{args.uri} : {throughput:9.0f} {description}")
+        return
+
+    for event_loop in args.loops:
+        uri = f"ws://127.0.0.1:{args.port}"
+        server = spawn_server(args.port, event_loop)
+        try:
+            asyncio.run(wait_for_server(uri))
+            throughput = asyncio.run(workload(uri))
+        finally:
+            stop_server(server)
+        print(f"{event_loop:>8} : {throughput:9.0f} {description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+connection churn memory regression check
+
+opens and closes --connections websocket connections against a server running in this process.
+they browse the lobby, play whole matches with a spectator, abandon matches they created,
+and drop and resume-session mid match. after a warm up, the live VimeraWebsocketsClient,
+Match and MatchNotification objects and RSS are tracked as the churn goes on.
+
+exits with status 1 if, once every connection is closed and abandoned matches have expired,
+any of those objects are still alive or memory grew by more than the thresholds.
+
+it also reports what one message costs on the hot path (list-games and game-action handled by
+VimeraWebsocketsServer.parse() against a stub websocket). CPython only counts the memory blocks that are
+allocated right now, not how many allocations were made, so what gets reported is:
+    - the net blocks one message leaves allocated, from sys.getallocatedblocks() and from the count
+      difference of tracemalloc snapshots around a batch (both should be ~0)
+    - the peak bytes allocated at once while one message is handled
+
+the churn itself runs without tracemalloc (it slows everything down about five times),
+a shorter --traced-connections run afterwards is what gets tracemalloc snapshots
+
+usage:
+    python benchmarks/memory_soak.py [--connections 200000] [--traced-connections 10000] [--concurrency 50]
+                                     [--max-rss-growth-mb 20] [--max-traced-growth-mb 5]
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict
+
+import websockets.client
+from websockets.protocol import State
+
+from harness import running_server, moves_to_win, request, response
+
+# short, so abandoned matches expire during the run instead of piling up for a minute
+RESUME_GRACE_SECONDS = 0.2
+
+def rss_bytes() -> int:
+    """
+    resident set size of this process, from /proc where there is one (falls back to the peak RSS)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def tracked_classes() -> Dict[str, type]:
+    """
+    the server classes whose instances should not outlive the connections and matches they belong to,
+    from the modules the running server imported. checked by class, not by name, since re.Match is a "Match" too
+    """
+    import match as match_module
+    import server as server_module
+    return {
+            "VimeraWebsocketsClient": server_module.VimeraWebsocketsClient,
+            "Match": match_module.Match,
+            "MatchNotification": match_module.MatchNotification
+            }
+
+
+def live_objects(tracked: Dict[str, type]) -> Dict[str, int]:
+    """
+    how many instances of the tracked classes (or their subclasses) the garbage collector knows of
+    """
+    counts = dict.fromkeys(tracked, 0)
+    for obj in gc.get_objects():
+        for name, cls in tracked.items():
+            if isinstance(obj, cls):
+                counts[name] += 1
+                break
+    return counts
+
+
+async def _browse(uri: str) -> int:
+    async with websockets.client.connect(uri) as websocket:
+        await websocket.send(request("list-games"))
+        await response(websocket)
+        await websocket.send(request("subscribe-lobby", game="p1wins"))
+        await response(websocket)
+        await websocket.send(request("list-matches", game="p1wins"))
+        await response(websocket)
+    return 1
+
+
+async def _abandon(uri: str) -> int:
+    async with websockets.client.connect(uri) as websocket:
+        await websocket.send(request("create-match", game="p1wins", **{"player-name": "p1"}))
+        await response(websocket)
+    return 1
+
+
+async def _play(uri: str, players: Dict, match_id: str, tokens: Dict, drop_and_resume: bool) -> int:
+    """
+    play a p1wins match to the end, optionally dropping p1 halfway and resuming their session
+
+    Returns:
+        how many extra connections that took
+    """
+    extra_connections = 0
+    moves = 0
+    turn = "p1"
+    while True:
+        await players[turn].send(request("game-action", **{"match-id": match_id, "player-name": turn, "action": "move"}))
+        await response(players[turn])
+        moves += 1
+        turn = "p2" if turn == "p1" else "p1"
+
+        if drop_and_resume and moves == 3:
+            await players["p1"].close()
+            players["p1"] = await websockets.client.connect(uri)
+            extra_connections += 1
+            await players["p1"].send(request("resume-session", **{"session-token": tokens["p1"]}))
+            await response(players["p1"])
+
+        if moves == 10:
+            return extra_connections
+
+
+async def _match(uri: str, drop_and_resume: bool) -> int:
+    players = {"p1": await websockets.client.connect(uri), "p2": await websockets.client.connect(uri)}
+    spectator = await websockets.client.connect(uri)
+    try:
+        tokens = {}
+        await players["p1"].send(request("create-match", game="p1wins", **{"player-name": "p1"}))
+        result = (await response(players["p1"]))["result"]
+        match_id, tokens["p1"] = result["match-id"], result["session-token"]
+
+        await spectator.send(request("spectate-match", **{"match-id": match_id}))
+        await response(spectator)
+
+        await players["p2"].send(request("join-match", **{"match-id": match_id, "player-name": "p2"}))
+        await response(players["p2"])
+
+        extra_connections = await _play(uri, players, match_id, tokens, drop_and_resume)
+    finally:
+        for websocket in list(players.values()) + [spectator]:
+            await websocket.close()
+    return 3 + extra_connections
+
+
+async def churn(uri: str, connections: int, concurrency: int, on_progress=None) -> int:
+    """
+    run the scenarios round robin, concurrency at a time, until connections connections were opened
+
+    Returns:
+        the number of connections actually opened
+    """
+    scenarios = [
+            lambda: _browse(uri),
+            lambda: _match(uri, drop_and_resume=False),
+            lambda: _abandon(uri),
+            lambda: _match(uri, drop_and_resume=True),
+            ]
+    opened = 0
+    next_report = connections // 10
+    round_number = 0
+    while opened < connections:
+        batch = [scenarios[(round_number + i) % len(scenarios)]() for i in range(concurrency)]
+        round_number += concurrency
+        opened += sum(await asyncio.gather(*batch))
+        if on_progress is not None and opened >= next_report:
+            on_progress(opened)
+            next_report += connections // 10
+    return opened
+
+
+async def _settle():
+    """
+    let abandoned matches expire and closed connections finish up, then collect garbage
+    """
+    await asyncio.sleep(RESUME_GRACE_SECONDS * 2 + 0.5)
+    gc.collect()
+
+
+class StubWebSocket:
+    """
+    just enough of a legacy websockets connection for send() and websockets.broadcast() to go nowhere
+
+    broadcast() reaches into private attributes of the legacy WebSocketCommonProtocol
+    (_fragmented_message_waiter, write_frame_sync), as of websockets 12.0.
+    other versions may need this updated
+    """
+    state = State.OPEN
+    _fragmented_message_waiter = None
+
+    async def send(self, message):
+        pass
+
+    def write_frame_sync(self, fin, opcode, data):
+        pass
+
+
+async def hot_path_costs(messages: int) -> Dict[str, Dict[str, float]]:
+    """
+    feed list-games and game-action requests straight to parse(), for both: net blocks left
+    allocated per message (sys.getallocatedblocks and tracemalloc snapshots) and peak traced bytes
+    while one message is handled
+    """
+    async with running_server() as server:
+        import server as server_module
+        with moves_to_win(server, 10 ** 9):
+            players = {name: server_module.VimeraWebsocketsClient(StubWebSocket()) for name in ("p1", "p2")}
+            await server.parse(players["p1"], request("create-match", game="p1wins", **{"player-name": "p1"}))
+            match_id = next(iter(server.matches))
+            await server.parse(players["p2"], request("join-match", **{"match-id": match_id, "player-name": "p2"}))
+
+            turns = ["p1", "p2"]
+            actions = {name: request("game-action", **{"match-id": match_id, "player-name": name, "action": "move"}) for name in turns}
+            list_games = request("list-games")
+
+            async def one_list_games(i):
+                await server.parse(players["p1"], list_games)
+
+            async def one_game_action(i):
+                name = turns[i % 2]
+                await server.parse(players[name], actions[name])
+
+            costs = {}
+            for label, handle in (("list-games", one_list_games), ("game-action", one_game_action)):
+                # warm up caches and free lists first
+                for i in range(1000):
+                    await handle(i)
+
+                gc.collect()
+                blocks_before = sys.getallocatedblocks()
+                for i in range(messages):
+                    await handle(i)
+                gc.collect()
+                net_blocks = (sys.getallocatedblocks() - blocks_before) / messages
+
+                was_tracing = tracemalloc.is_tracing()
+                if not was_tracing:
+                    tracemalloc.start()
+                traced_messages = min(messages, 2000)
+                for i in range(100):
+                    await handle(i)
+
+                gc.collect()
+                snapshot_before = tracemalloc.take_snapshot()
+                for i in range(traced_messages):
+                    await handle(i)
+                gc.collect()
+                snapshot_after = tracemalloc.take_snapshot()
+                traced_blocks = sum(stat.count_diff for stat in snapshot_after.compare_to(snapshot_before, "filename")) / traced_messages
+
+                peaks = []
+                for i in range(traced_messages):
+                    tracemalloc.reset_peak()
+                    current_before = tracemalloc.get_traced_memory()[0]
+                    await handle(i)
+                    peaks.append(tracemalloc.get_traced_memory()[1] - current_before)
+                if not was_tracing:
+                    tracemalloc.stop()
+
+                costs[label] = {"net_blocks": net_blocks, "traced_blocks": traced_blocks, "peak_bytes": sum(peaks) / len(peaks)}
+
+    return costs
+
+
+async def soak(args) -> bool:
+    async with running_server() as server:
+        import server as server_module
+        server_module.RESUME_GRACE_SECONDS = RESUME_GRACE_SECONDS
+        uri = f"ws://127.0.0.1:{server.port}"
+
+        warm_up = max(args.connections // 20, args.concurrency * 4)
+        await churn(uri, warm_up, args.concurrency)
+        await _settle()
+
+        tracked = tracked_classes()
+        baseline_objects = live_objects(tracked)
+        rss_samples = []
+        start = time.perf_counter()
+
+        def report(opened):
+            rss_samples.append(rss_bytes())
+            print(f"  {opened:8d} connections  {time.perf_counter() - start:7.1f} s  rss {rss_samples[-1] / 2 ** 20:7.1f} MiB"
+                  f"  matches {len(server.matches):5d}  clients {len(server.clients):5d}", flush=True)
+
+        # untraced, tracemalloc slows the churn down about five times
+        opened = await churn(uri, args.connections, args.concurrency, report)
+        await _settle()
+
+        final_objects = live_objects(tracked)
+        final_rss = rss_bytes()
+
+        # the allocator keeps the arenas it needed for the peak number of connections in flight,
+        # so RSS is measured from the first sample, once that peak has been reached
+        rss_growth = (final_rss - rss_samples[0]) / 2 ** 20
+
+        # then a shorter traced run, to see where any retained memory comes from
+        tracemalloc.start()
+        await churn(uri, args.concurrency * 4, args.concurrency)
+        await _settle()
+        baseline_snapshot = tracemalloc.take_snapshot()
+        await churn(uri, args.traced_connections, args.concurrency)
+        await _settle()
+        final_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        leftovers = {"matches": len(server.matches), "sessions": len(server.sessions), "clients": len(server.clients)}
+
+    traced_growth = sum(stat.size_diff for stat in final_snapshot.compare_to(baseline_snapshot, "filename")) / 2 ** 20
+
+    print(f"\n{opened} connections churned, then {args.traced_connections} traced")
+    print(f"  rss growth {rss_growth:+.2f} MiB after the first 10% (limit {args.max_rss_growth_mb})")
+    print(f"  tracemalloc growth {traced_growth:+.2f} MiB (limit {args.max_traced_growth_mb})")
+    print(f"  live objects before {baseline_objects}")
+    print(f"  live objects after  {final_objects}")
+    print(f"  left in the server  {leftovers}")
+    print("  largest tracemalloc growth:")
+    for stat in final_snapshot.compare_to(baseline_snapshot, "lineno")[:5]:
+        print(f"    {stat}")
+
+    failures = []
+    if rss_growth > args.max_rss_growth_mb:
+        failures.append(f"rss grew by {rss_growth:.2f} MiB")
+    if traced_growth > args.max_traced_growth_mb:
+        failures.append(f"tracemalloc'd memory grew by {traced_growth:.2f} MiB")
+    for name, count in final_objects.items():
+        if count > baseline_objects[name]:
+            failures.append(f"{count - baseline_objects[name]} more live {name} objects")
+    if any(leftovers.values()):
+        failures.append(f"server still holds {leftovers}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=200_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--traced-connections", type=int, default=10_000)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=20)
+    parser.add_argument("--max-traced-growth-mb", type=float, default=5)
+    parser.add_argument("--hot-path-messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    costs = asyncio.run(hot_path_costs(args.hot_path_messages))
+    print("hot path, per message (blocks left allocated, not allocations made, see the docstring):")
+    for label, cost in costs.items():
+        print(f"  {label:>12} : {cost['net_blocks']:+.3f} net blocks  {cost['traced_blocks']:+.3f} net traced blocks"
+              f"  {cost['peak_bytes']:8.0f} peak bytes allocated at once")
+    print()
+
+    passed = asyncio.run(soak(args))
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+game executor benchmark
+
+one match plays a game whose "think" action burns CPU for --think-ms, while --light-matches
+other p1wins matches keep moving. reports the round trip latency of those unrelated moves with
+the heavy action run inline on the event loop, in a thread pool, and in a process pool.
+
+the server runs in this process so the heavy game can be registered with it
+
+usage:
+    python benchmarks/offload_latency.py [--think-ms 200] [--light-matches 20] [--seconds 5]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List
+
+import websockets.client
+
+from harness import running_server, moves_to_win, request, response, percentile, BACKEND_DIR
+
+import sys
+sys.path.insert(0, BACKEND_DIR)
+from games import P1Wins
+
+
+class ThinkingGame(P1Wins):
+    """
+    p1wins where moving is called "think" and takes the "think-seconds" of CPU in its data.
+
+    the think time travels with every action rather than as a class attribute, and MOVES_TO_WIN is
+    its own, since a process pool that spawns its workers only sees the class as this module defines it
+    """
+    id = "thinking"
+    description = "p1wins, but slow"
+    cpu_bound_actions = frozenset({"think"})
+
+    # long enough that no match finishes during the benchmark
+    MOVES_TO_WIN = 1_000_000
+
+    def action(self, player, action, data):
+        if action == "think":
+            deadline = time.process_time() + data["think-seconds"]
+            while time.process_time() < deadline:
+                pass
+            action = "move"
+        return super().action(player, action, data)
+
+
+async def _play(uri: str, game: str, action: str, data: dict, stop: asyncio.Event, latencies: List[float]):
+    """
+    create and join a match of game, then send `action` with `data` from whoever's turn it is until stop is set,
+    recording the round trip of every action
+    """
+    async with websockets.client.connect(uri) as player1, websockets.client.connect(uri) as player2:
+        await player1.send(request("create-match", game=game, **{"player-name": "p1"}))
+        match_id = (await response(player1))["result"]["match-id"]
+        await player2.send(request("join-match", **{"match-id": match_id, "player-name": "p2"}))
+        await response(player2)
+
+        players = [("p1", player1), ("p2", player2)]
+        turn = 0
+        while not stop.is_set():
+            name, websocket = players[turn]
+            start = time.perf_counter()
+            await websocket.send(request("game-action", **{"match-id": match_id, "player-name": name, "action": action, "data": data}))
+            await response(websocket)
+            latencies.append(time.perf_counter() - start)
+            turn = 1 - turn
+
+
+async def run(executor, light_matches: int, seconds: float, think_seconds: float) -> List[float]:
+    async with running_server(game_executor=executor) as server:
+        server.games[ThinkingGame.id] = ThinkingGame
+        uri = f"ws://127.0.0.1:{server.port}"
+
+        # long enough that no match finishes during the benchmark, the light matches move inline
+        with moves_to_win(server, 1_000_000):
+            stop = asyncio.Event()
+            light_latencies: List[float] = []
+            heavy_latencies: List[float] = []
+            tasks = [asyncio.create_task(_play(uri, "p1wins", "move", {}, stop, light_latencies)) for _ in range(light_matches)]
+            tasks.append(asyncio.create_task(_play(uri, ThinkingGame.id, "think", {"think-seconds": think_seconds}, stop, heavy_latencies)))
+
+            await asyncio.sleep(seconds)
+            stop.set()
+            await asyncio.gather(*tasks)
+        del server.games[ThinkingGame.id]
+
+    return light_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--think-ms", type=float, default=200)
+    parser.add_argument("--light-matches", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    for name, make_executor in (("inline", lambda: None),
+                                ("thread", lambda: ThreadPoolExecutor(args.workers)),
+                                ("process", lambda: ProcessPoolExecutor(args.workers))):
+        executor = make_executor()
+        try:
+            latencies = asyncio.run(run(executor, args.light_matches, args.seconds, args.think_ms / 1000))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        print(f"{name:>8} : unrelated moves p50 {statistics.median(latencies) * 1000:7.2f} ms"
+              f"  p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  max {max(latencies) * 1000:7.2f} ms"
+              f"  ({len(latencies)} moves, {args.think_ms:.0f} ms think)")
+
+
+if __name__ == "__main__":
+    main()
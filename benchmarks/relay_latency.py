@@ -0,0 +1,110 @@
+"""
+spectator relay benchmark
+
+starts one authoritative server plus N relay processes (UPSTREAM pointing at it),
+spreads spectators evenly over the relays (or puts them all on the game server when N is 0),
+plays p1wins matches and measures how long every notification takes to reach every spectator,
+from the moment the player sent the request that caused it.
+
+usage:
+    python benchmarks/relay_latency.py [--relays 0 1 2 4] [--spectators 500] [--matches 3]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import websockets.client
+
+from harness import spawn_server, stop_server, wait_for_server, request, response, notification, percentile
+
+
+async def _spectate(uri: str, match_id: str, subscribed: asyncio.Event, arrivals: List[float]):
+    """
+    spectate match_id through uri, recording the arrival time of every notification until the end one
+    """
+    async with websockets.client.connect(uri, max_queue=None) as websocket:
+        await websocket.send(request("spectate-match", **{"match-id": match_id}))
+        await response(websocket)
+        subscribed.set()
+
+        async for raw_message in websocket:
+            arrivals.append(time.perf_counter())
+            if '"event":"end"' in raw_message:
+                return
+
+
+async def play_match(game_server: str, spectator_servers: List[str], spectators: int) -> List[float]:
+    """
+    play one p1wins match with `spectators` spectators spread over spectator_servers
+
+    Returns:
+        notification delivery latencies in seconds, one per notification per spectator
+    """
+    async with websockets.client.connect(game_server) as player1, websockets.client.connect(game_server) as player2:
+        await player1.send(request("create-match", game="p1wins", **{"player-name": "p1"}))
+        match_id = (await response(player1))["result"]["match-id"]
+
+        events = [asyncio.Event() for _ in range(spectators)]
+        arrivals = [[] for _ in range(spectators)]
+        spectator_tasks = [
+                asyncio.create_task(_spectate(spectator_servers[i % len(spectator_servers)], match_id, events[i], arrivals[i]))
+                for i in range(spectators)
+                ]
+        await asyncio.gather(*(event.wait() for event in events))
+
+        # every request that causes a notification, and when it was sent
+        sent = [time.perf_counter()]
+        await player2.send(request("join-match", **{"match-id": match_id, "player-name": "p2"}))
+        latest = await notification(player1)
+
+        players = {"p1": player1, "p2": player2}
+        while latest["event"] != "end":
+            turn = latest["data"]["game-state"]["turn"]
+            sent.append(time.perf_counter())
+            await players[turn].send(request("game-action", **{"match-id": match_id, "player-name": turn, "action": "move"}))
+            latest = await notification(player1)
+
+        await asyncio.gather(*spectator_tasks)
+
+    latencies = []
+    for spectator_arrivals in arrivals:
+        assert len(spectator_arrivals) == len(sent), (len(spectator_arrivals), len(sent))
+        latencies.extend(arrival - sent_at for arrival, sent_at in zip(spectator_arrivals, sent))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--relays", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--spectators", type=int, default=500)
+    parser.add_argument("--matches", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--event-loop", default="asyncio")
+    args = parser.parse_args()
+
+    game_server = f"ws://127.0.0.1:{args.port}"
+
+    for relay_count in args.relays:
+        servers = [spawn_server(args.port, args.event_loop)]
+        relay_uris = [f"ws://127.0.0.1:{args.port + 1 + i}" for i in range(relay_count)]
+        servers.extend(spawn_server(args.port + 1 + i, args.event_loop, UPSTREAM=game_server) for i in range(relay_count))
+        try:
+            for uri in [game_server] + relay_uris:
+                asyncio.run(wait_for_server(uri))
+
+            latencies = []
+            for _ in range(args.matches):
+                latencies.extend(asyncio.run(play_match(game_server, relay_uris or [game_server], args.spectators)))
+        finally:
+            for server in servers:
+                stop_server(server)
+
+        print(f"{relay_count:2d} relays : p50 {statistics.median(latencies) * 1000:7.2f} ms"
+              f"  p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  max {max(latencies) * 1000:7.2f} ms"
+              f"  ({args.spectators} spectators x {args.matches} matches, {len(latencies)} deliveries)")
+
+
+if __name__ == "__main__":
+    main()
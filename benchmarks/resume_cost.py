@@ -0,0 +1,251 @@
+"""
+session resumption benchmark
+
+a reconnect storm after a network blip or deploy: every client of a p1wins match drops at once
+and comes back, timed until all of them have caught up with the match, and what that cost on the wire.
+
+spectators (--spectators of one match) drop while the players keep playing --missed moves, then come back by
+
+    resume : spectate-match with the last seq they saw, getting the latest notification if they missed any
+    before : spectate-match the way it worked before sessions, which sends nothing about the match
+             until its next notification. the players make their next move once every spectator is back
+
+players (--matches matches that were --missed moves in) all drop, then come back by
+
+    resume : resume-session with their session-token and the last seq they saw
+    before : before sessions a dropped player lost their seat, so the only way back to the same game was
+             a new match (create-match, join-match) and playing every move again
+
+the server runs in this process so that matches can be made as long as needed
+
+usage:
+    python benchmarks/resume_cost.py [--spectators 500] [--matches 100] [--missed 0 4 32 200]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+import websockets.client
+
+from harness import running_server, moves_to_win, request
+
+
+class Players:
+    """
+    the two players of a p1wins match, taking turns moving.
+    counts the messages and bytes both of them received
+    """
+    def __init__(self, uri: str) -> None:
+        self.uri = uri
+        self.match_id = None
+        self.seq = 0
+        self.tokens = {}
+        self.received = [0, 0]
+        self._turn = "p1"
+
+    async def __aenter__(self):
+        self._connections = {
+                "p1": await websockets.client.connect(self.uri),
+                "p2": await websockets.client.connect(self.uri)
+                }
+        await self._connections["p1"].send(request("create-match", game="p1wins", **{"player-name": "p1"}))
+        result = (await self._recv("p1"))["result"]
+        self.match_id, self.tokens["p1"] = result["match-id"], result["session-token"]
+        return self
+
+    async def _recv(self, player: str) -> dict:
+        raw_message = await self._connections[player].recv()
+        self.received[0] += 1
+        self.received[1] += len(raw_message)
+        return json.loads(raw_message)
+
+    async def _notification(self, player: str) -> dict:
+        """
+        wait for the next notification on a player's connection, skipping responses
+        """
+        while True:
+            message = await self._recv(player)
+            if message["type"] == "notification":
+                return message
+
+    async def start(self):
+        await self._connections["p2"].send(request("join-match", **{"match-id": self.match_id, "player-name": "p2"}))
+        self.tokens["p2"] = (await self._recv("p2"))["result"]["session-token"]
+        await self._notification("p2")
+        self.seq = (await self._notification("p1"))["seq"]
+
+    async def move(self, moves: int):
+        for _ in range(moves):
+            await self._connections[self._turn].send(request("game-action", **{"match-id": self.match_id, "player-name": self._turn, "action": "move"}))
+            await self._notification("p2")
+            notification = await self._notification("p1")
+            self.seq = notification["seq"]
+            self._turn = notification["data"]["game-state"]["turn"]
+
+    async def __aexit__(self, *exc_info):
+        for connection in self._connections.values():
+            await connection.close()
+
+
+async def _recv(websocket, received: List[int]) -> dict:
+    """
+    receive one message, adding it to the [messages, bytes] in received
+    """
+    raw_message = await websocket.recv()
+    received[0] += 1
+    received[1] += len(raw_message)
+    message = json.loads(raw_message)
+    assert "error" not in message, message
+    return message
+
+
+async def _read_until(websocket, seq: Optional[int], target_seq: int, received: List[int]) -> None:
+    """
+    read a connection that last saw seq until it has seen the notification with target_seq
+    """
+    while seq != target_seq:
+        message = await _recv(websocket, received)
+        if message["type"] == "notification":
+            seq = message["seq"]
+
+
+async def _spectate(uri: str, match_id: str) -> int:
+    """
+    spectate until caught up with the match, then drop the connection
+
+    Returns:
+        the last seq seen
+    """
+    async with websockets.client.connect(uri) as websocket:
+        await websocket.send(request("spectate-match", **{"match-id": match_id, "last-seq": 0}))
+        while True:
+            message = json.loads(await websocket.recv())
+            if message["type"] == "notification":
+                return message["seq"]
+
+
+async def _respectate(uri: str, mode: str, match_id: str, last_seq: int, current_seq: int, back: asyncio.Queue) -> List[int]:
+    """
+    reconnect one spectator and read until it has caught up,
+    telling back once it is spectating again
+
+    Returns:
+        [messages received, bytes received]
+    """
+    received = [0, 0]
+    async with websockets.client.connect(uri) as websocket:
+        if mode == "resume":
+            await websocket.send(request("spectate-match", **{"match-id": match_id, "last-seq": last_seq}))
+            await _recv(websocket, received)
+            await _read_until(websocket, last_seq, current_seq, received)
+        else:
+            # knows nothing about the match until the next move
+            await websocket.send(request("spectate-match", **{"match-id": match_id}))
+            await _recv(websocket, received)
+            back.put_nowait(True)
+            await _read_until(websocket, None, current_seq + 1, received)
+    return received
+
+
+async def spectator_storm(mode: str, spectators: int, missed: int) -> None:
+    async with running_server() as server:
+        uri = f"ws://127.0.0.1:{server.port}"
+
+        # long enough that nobody finishes during the benchmark
+        with moves_to_win(server, 1_000_000):
+            async with Players(uri) as players:
+                await players.start()
+                seqs = await asyncio.gather(*(_spectate(uri, players.match_id) for _ in range(spectators)))
+
+                # the spectators are gone, the match goes on without them
+                await players.move(missed)
+
+                back = asyncio.Queue()
+                start = time.perf_counter()
+                storm = asyncio.gather(*(_respectate(uri, mode, players.match_id, seq, players.seq, back) for seq in seqs))
+                if mode == "before":
+                    for _ in range(spectators):
+                        await back.get()
+                    await players.move(1)
+                received = await storm
+                elapsed = time.perf_counter() - start
+
+        _report("spectators", mode, missed, elapsed, spectators, received)
+
+
+async def _resume_player(uri: str, players: Players, player: str) -> List[int]:
+    """
+    resume-session one dropped player and read until it has caught up
+
+    Returns:
+        [messages received, bytes received]
+    """
+    received = [0, 0]
+    async with websockets.client.connect(uri) as websocket:
+        await websocket.send(request("resume-session", **{"session-token": players.tokens[player], "last-seq": players.seq}))
+        await _recv(websocket, received)
+    return received
+
+
+async def _replay_match(uri: str, moves: int) -> List[int]:
+    """
+    what a pair of dropped players had to do before sessions to get back to a game <moves> moves in
+
+    Returns:
+        [messages received, bytes received] by both players
+    """
+    async with Players(uri) as players:
+        await players.start()
+        await players.move(moves)
+    return players.received
+
+
+async def player_storm(mode: str, matches: int, missed: int) -> None:
+    async with running_server() as server:
+        uri = f"ws://127.0.0.1:{server.port}"
+
+        with moves_to_win(server, 1_000_000):
+            # every match is <missed> moves in when all of its players drop
+            dropped: List[Players] = []
+            for _ in range(matches):
+                async with Players(uri) as players:
+                    await players.start()
+                    await players.move(missed)
+                dropped.append(players)
+
+            start = time.perf_counter()
+            if mode == "resume":
+                received = await asyncio.gather(*(_resume_player(uri, players, player) for players in dropped for player in ("p1", "p2")))
+            else:
+                received = await asyncio.gather(*(_replay_match(uri, missed) for _ in dropped))
+            elapsed = time.perf_counter() - start
+
+    _report("players", mode, missed, elapsed, 2 * matches, received)
+
+
+def _report(clients: str, mode: str, missed: int, elapsed: float, count: int, received: List[List[int]]) -> None:
+    messages = sum(messages for messages, _ in received)
+    sent_bytes = sum(size for _, size in received)
+    print(f"{clients:>10} {mode:>6} missed {missed:4d} : {elapsed * 1000:8.1f} ms for all to catch up"
+          f"  {elapsed / count * 1e6:7.1f} us/client"
+          f"  {messages / count:5.1f} msgs/client  {sent_bytes / count:8.0f} bytes/client")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spectators", type=int, default=500)
+    parser.add_argument("--matches", type=int, default=100)
+    parser.add_argument("--missed", type=int, nargs="+", default=[0, 4, 32, 200])
+    args = parser.parse_args()
+
+    for missed in args.missed:
+        for mode in ("resume", "before"):
+            asyncio.run(spectator_storm(mode, args.spectators, missed))
+        for mode in ("resume", "before"):
+            asyncio.run(player_storm(mode, args.matches, missed))
+
+
+if __name__ == "__main__":
+    main()
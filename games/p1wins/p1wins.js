@@ -9,12 +9,29 @@ function getWebSocketServer() {
   }
 }
 
+// spectator relays to spread spectate connections over, per page host.
+// each is a server started with UPSTREAM pointing at the game server,
+// if a host has none, spectators connect to the game server directly
+const SPECTATOR_RELAYS = {
+  "fkbad.github.io": [],
+  "localhost:8000": [],
+};
+
+function getSpectatorServer() {
+  const relays = SPECTATOR_RELAYS[window.location.host] || [];
+  if (relays.length === 0) {
+    return getWebSocketServer();
+  }
+  return relays[Math.floor(Math.random() * relays.length)];
+}
+
 // overall initializer, the bootstrap or "main"
 window.addEventListener("DOMContentLoaded", () => {
   // Open the WebSocket connection and register event handlers.
   // port specified in main() of `app.py`
 
-  const websocket_address = getWebSocketServer()
+  const spectating = new URLSearchParams(window.location.search).has("spectate")
+  const websocket_address = spectating ? getSpectatorServer() : getWebSocketServer()
   const websocket = new WebSocket(websocket_address);
 
   // listening for someone opening a websocket
@@ -23,9 +40,58 @@ window.addEventListener("DOMContentLoaded", () => {
   // listen for messages
   listen(websocket)
 
+  // come back into the match if the connection drops
+  resumeOnClose(websocket, websocket_address)
+
 });
 
 
+// what we need to come back after the connection drops.
+// token comes from the create/join response, players resume-session with it.
+// spectators have no token, they spectate the match again.
+// last_seq is the "seq" of the last notification we got, so we are only
+// sent the latest state if we missed something
+const session = {
+  "token": null,
+  "spectating": null,
+  "last_seq": null
+}
+
+function resumeOnClose(websocket, websocket_address) {
+  websocket.addEventListener("close", () => {
+    if (session.token === null && session.spectating === null) {
+      return
+    }
+
+    setTimeout(() => {
+      const resumed_websocket = new WebSocket(websocket_address);
+      resumed_websocket.addEventListener("open", () => {
+        let message = {
+          "type": "request",
+          "id": "resume-" + Math.random().toString(36).slice(2, 7),
+          "operation": "resume-session",
+          "params": {
+            "session-token": session.token,
+            "last-seq": session.last_seq
+          }
+        }
+        if (session.token === null) {
+          message.operation = "spectate-match"
+          message.params = {
+            "match-id": session.spectating,
+            "last-seq": session.last_seq === null ? 0 : session.last_seq
+          }
+        }
+        console.log("sending >>> ", message)
+        resumed_websocket.send(JSON.stringify(message))
+      });
+      listen(resumed_websocket)
+      resumeOnClose(resumed_websocket, websocket_address)
+    }, 1000)
+  });
+}
+
+
 
 // prototype
 // function init(websocket) {
@@ -108,13 +174,15 @@ function initGame(websocket) {
 
 
     } else if (spectate_match_id) {
-      // spectating match
+      // spectating match, last-seq 0 to be sent the current state right away
       message.operation = "spectate-match"
       const params = {
         "match-id" : spectate_match_id,
-        "player-name" : "player2"
+        "player-name" : "player2",
+        "last-seq" : 0
       }
       message.params = params
+      session.spectating = spectate_match_id
     } else  { 
       // TODO make global utils to store the information
       // about message format so this could be a global variable call
@@ -138,6 +206,16 @@ function listen(websocket) {
     // receive message from the server
     const message = JSON.parse(data);
     console.log("recieved <<<", message)
+
+    if (message.type === "response" && message.result && message.result["session-token"]) {
+      session.token = message.result["session-token"]
+    } else if (message.type === "response" && message.error && String(message.id).startsWith("resume-")) {
+      // our session expired (or the match is gone), nothing left to resume
+      session.token = null
+      session.spectating = null
+    } else if (message.type === "notification") {
+      session.last_seq = message.seq
+    }
     // switch (message.type) {
     //   case "error":
     //     showMessage(message.message);
@@ -54,6 +54,27 @@ function init(websocket) {
   const jsoned_message = JSON.stringify(message)
   console.log("sending >>>", message)
   websocket.send(jsoned_message)
+
+  // open p1wins matches: subscribe first so no match is missed between
+  // the listing and the subscription, lobby notifications then keep it current
+  const lobby_messages = [
+    {
+      type: "request",
+      operation: "subscribe-lobby",
+      id: id,
+      params: { "game": "p1wins" }
+    },
+    {
+      type: "request",
+      operation: "list-matches",
+      id: id,
+      params: { "game": "p1wins" }
+    }
+  ]
+  for (const lobby_message of lobby_messages) {
+    console.log("sending >>>", lobby_message)
+    websocket.send(JSON.stringify(lobby_message))
+  }
   });
 }
 
@@ -63,5 +84,44 @@ function listen(websocket) {
     const message = JSON.parse(data);
     console.log("recieved <<<", message)
 
+    if (message.type === "response" && message.result && message.result.matches) {
+      // list-matches, only the first page is shown
+      for (const match of message.result.matches) {
+        addOpenMatch(match)
+      }
+    } else if (message.type === "notification" && message.scope === "lobby") {
+      if (message.event === "add") {
+        addOpenMatch(message.data)
+      } else if (message.event === "remove") {
+        removeOpenMatch(message.data["match-id"])
+      }
+    }
   });
 }
+
+function openMatchElementId(match_id) {
+  return "open-match-" + match_id
+}
+
+function addOpenMatch(match) {
+  // the subscription can announce a match the listing then includes too
+  if (document.getElementById(openMatchElementId(match["match-id"]))) {
+    return
+  }
+
+  const link = document.createElement("a")
+  link.href = "games/" + match["game-id"] + "/?join=" + encodeURIComponent(match["match-id"])
+  link.textContent = "Join " + match["match-id"] + " (" + match["players"].join(", ") + ")"
+
+  const item = document.createElement("li")
+  item.id = openMatchElementId(match["match-id"])
+  item.appendChild(link)
+  document.getElementById("p1wins_matches").appendChild(item)
+}
+
+function removeOpenMatch(match_id) {
+  const item = document.getElementById(openMatchElementId(match_id))
+  if (item) {
+    item.remove()
+  }
+}
@@ -0,0 +1,82 @@
+"""
+Module for things shared between the server, matches and game logic
+"""
+import json
+
+from enum import Enum
+
+
+# https://github.com/uchicago-cs/chimera/blob/e4feef8d35048dc16d7b71d26f88197a0ebcc7db/src/chimera/common/__init__.py#L4
+class ErrorCode(Enum):
+    # General error codes
+    PARSE_ERROR = -32700
+    INCORRECT_REQUEST = -32600
+    NO_SUCH_OPERATION = -32601
+    INCORRECT_PARAMS = -32602
+
+    # Operation-specific codes
+    UNKNOWN_GAME = -40100
+    ALREADY_IN_MATCH = -40101
+    UNKNOWN_MATCH = -40102
+    DUPLICATE_PLAYER = -40103
+    INCORRECT_MATCH = -40104
+
+    # game-action codes
+    GAME_NOT_PLAYER_TURN = -50100
+    GAME_NO_SUCH_ACTION = -50101
+    GAME_INCORRECT_ACTION_DATA = -50102
+    GAME_INCORRECT_MOVE = -50103
+    # not part of the chimera error codes
+    GAME_ACTION_TIMEOUT = -50104
+
+    def __str__(self):
+        return ERROR_MESSAGES[self.value]
+
+
+ERROR_MESSAGES = {
+    # General error codes
+    ErrorCode.PARSE_ERROR.value: "Parse error",
+    ErrorCode.INCORRECT_REQUEST.value: "Incorrect request",
+    ErrorCode.NO_SUCH_OPERATION.value: "No such operation",
+    ErrorCode.INCORRECT_PARAMS.value: "Incorrect parameters",
+
+    # Operation-specific codes
+    ErrorCode.UNKNOWN_GAME.value: "Unknown game",
+    ErrorCode.ALREADY_IN_MATCH.value: "Already in a match",
+    ErrorCode.UNKNOWN_MATCH.value: "Unknown match",
+    ErrorCode.DUPLICATE_PLAYER.value: "Duplicate player name",
+    ErrorCode.INCORRECT_MATCH.value: "Incorrect match",
+
+    # game-action codes
+    ErrorCode.GAME_NOT_PLAYER_TURN.value: "Action not allowed outside player's turn",
+    ErrorCode.GAME_NO_SUCH_ACTION.value: "Unsupported action in game",
+    ErrorCode.GAME_INCORRECT_ACTION_DATA.value: "Incorrect data in game action",
+    ErrorCode.GAME_INCORRECT_MOVE.value: "Incorrect move",
+    ErrorCode.GAME_ACTION_TIMEOUT.value: "Game action timed out"
+}
+
+
+class OperationError(Exception):
+    """
+    raised anywhere below VimeraWebsocketsServer.parse() when an operation can't be carried out.
+
+    parse() catches it and sends it to the client as an error response
+
+    Attributes:
+        error_code : the ErrorCode to send
+        details : human readable explanation, sent as the "details" member of the error data
+    """
+    def __init__(self, error_code: ErrorCode, details: str) -> None:
+        super().__init__(details)
+        self.error_code = error_code
+        self.details = details
+
+    def __reduce__(self):
+        # so game logic running in a process pool can raise it back to the server
+        return (OperationError, (self.error_code, self.details))
+
+
+# shared encoder for everything sent over the wire.
+# json.dumps() builds a new JSONEncoder on every call when given any options,
+# and indent= forces the pure python encoder, so we keep a single compact one around
+JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
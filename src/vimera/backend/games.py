@@ -0,0 +1,135 @@
+"""
+Module to hold the game logic for every game the server can host
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, FrozenSet, List, Optional, Tuple, Type
+
+from common import ErrorCode, OperationError
+
+
+class Game(ABC):
+    """
+    base class for the logic of a single game being played in a Match
+
+    a Game knows nothing about websockets or clients, it only sees player names,
+    so it can be driven by anything that can call action()
+
+    class attributes:
+        id : the game id used in create-match and list-games
+        description : human readable description for list-games
+        players_needed : how many players have to join before the match starts
+        cpu_bound_actions : actions expensive enough that the server should run them in its
+                            game executor instead of on the event loop (see Match.offload_game_action).
+                            the Game has to be picklable for that when the executor is a process pool
+
+    attributes:
+        players : player names in the order they joined the match
+        done : True once the game has finished
+        winner : player name of the winner once done, None until then (or for a draw)
+    """
+    id: str
+    description: str
+    players_needed: int = 2
+    cpu_bound_actions: FrozenSet[str] = frozenset()
+
+    def __init__(self, players: List[str]) -> None:
+        self.players = list(players)
+        self.done = False
+        self.winner: Optional[str] = None
+
+    @abstractmethod
+    def game_state(self) -> dict:
+        """
+        returns the JSON-like "game-state" member sent in match notifications
+        """
+
+    @abstractmethod
+    def action(self, player: str, action: str, data: dict) -> dict:
+        """
+        perform a game-action on behalf of player
+
+        Inputs:
+            player : name of the player performing the action
+            action : the "action" param of the game-action request
+            data : the "data" param of the game-action request, {} if it was not given
+
+        Returns:
+            the "result" member of the game-action response
+
+        Raises:
+            OperationError with one of the GAME_* ErrorCodes if the action is not allowed
+        """
+
+    @abstractmethod
+    def legal_actions(self, player: str) -> List[Tuple[str, dict]]:
+        """
+        every (action, data) player could send right now without getting an error,
+        used by the bots in simulator.py. empty when it is not player's turn
+        """
+
+
+class P1Wins(Game):
+    """
+    player 1 wins that's literally it
+
+    players take turns sending the "move" action, once MOVES_TO_WIN moves
+    have been made the game ends and player 1 wins
+    """
+    id = "p1wins"
+    description = "player 1 wins that's literally it"
+    players_needed = 2
+
+    MOVES_TO_WIN = 10
+
+    def __init__(self, players: List[str]) -> None:
+        super().__init__(players)
+        self.moves = 0
+        self.turn = self.players[0]
+
+    def game_state(self) -> dict:
+        return {
+                "players": self.players,
+                "turn": self.turn,
+                "moves": self.moves
+                }
+
+    def action(self, player: str, action: str, data: dict) -> dict:
+        if action != "move":
+            raise OperationError(ErrorCode.GAME_NO_SUCH_ACTION, f"p1wins only supports the 'move' action, not [{action}]")
+
+        if player != self.turn:
+            raise OperationError(ErrorCode.GAME_NOT_PLAYER_TURN, f"it is {self.turn}'s turn")
+
+        self.moves += 1
+        self.turn = self.players[self.moves % len(self.players)]
+
+        # type(self) so subclasses can set their own
+        if self.moves >= type(self).MOVES_TO_WIN:
+            self.done = True
+            self.winner = self.players[0]
+
+        return {}
+
+    def legal_actions(self, player: str) -> List[Tuple[str, dict]]:
+        if self.done or player != self.turn:
+            return []
+        return [("move", {})]
+
+
+def run_game_action(game: Game, player: str, action: str, data: dict) -> Tuple[Game, dict]:
+    """
+    Game.action() as a plain function for executors to call
+
+    Returns:
+        (game, result). game is the same object that was passed in, which matters when it
+        ran in another process: the caller gets back the copy the action was applied to
+    """
+    result = game.action(player, action, data)
+    return game, result
+
+
+# game id : Game subclass
+# every game the server can host, VALID_GAMES in server.py is built from this
+GAMES: Dict[str, Type[Game]] = {
+        P1Wins.id : P1Wins
+        }
@@ -0,0 +1,162 @@
+"""
+Module for the lobby: the matches of each game that are still waiting for players
+
+the listing is kept up to date as match statuses change instead of being built from
+self.matches on every request, and clients can subscribe to a game's lobby to be
+pushed every match that gets added to or removed from it
+"""
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import websockets
+
+from common import JSON_ENCODER
+from match import Match
+
+
+class _Listing:
+    """
+    the matches awaiting players of one game, in the order they were listed
+
+    seqs is sorted since lobby seqs only go up, so a page starts with a bisect.
+    removed matches leave their seq behind in seqs until there are enough of them
+    to be worth compacting, so both adding and removing are O(1) amortized
+    """
+    def __init__(self) -> None:
+        self.seqs: List[int] = []
+        # {seq : Match}
+        self.matches: Dict[int, Match] = {}
+        # {match_id : seq}
+        self.seq_of: Dict[str, int] = {}
+
+    def __contains__(self, match: Match) -> bool:
+        return match.id in self.seq_of
+
+    def add(self, seq: int, match: Match):
+        self.seqs.append(seq)
+        self.matches[seq] = match
+        self.seq_of[match.id] = seq
+
+    def remove(self, match: Match) -> bool:
+        """
+        Returns:
+            False if the match was not listed
+        """
+        seq = self.seq_of.pop(match.id, None)
+        if seq is None:
+            return False
+
+        del self.matches[seq]
+        if len(self.seqs) > 2 * len(self.matches) + 32:
+            self.seqs = [seq for seq in self.seqs if seq in self.matches]
+        return True
+
+    def page(self, cursor: Optional[int], limit: int) -> Tuple[List[Match], Optional[int]]:
+        """
+        Returns:
+            (up to limit matches listed after cursor, the cursor for the next page or None if this was the last)
+        """
+        page = []
+        index = 0 if cursor is None else bisect_right(self.seqs, cursor)
+        while index < len(self.seqs) and len(page) < limit:
+            match = self.matches.get(self.seqs[index])
+            if match is not None:
+                page.append(match)
+            index += 1
+
+        next_cursor = self.seqs[index - 1] if page and index < len(self.seqs) else None
+        return page, next_cursor
+
+
+class Lobby:
+    """
+    index of the matches in "awaiting-players" status, per game
+
+    attributes:
+        subscribers : {game_id : {websocket : client}} of clients that asked for lobby notifications
+    """
+    def __init__(self) -> None:
+        self._listings: Dict[str, _Listing] = {}
+        self._next_seq = 0
+        self.subscribers: Dict[str, Dict] = {}
+
+    def match_status_changed(self, match: Match, old_status, new_status):
+        """
+        Match.status_listeners callback, (un)lists the match as it starts or stops awaiting players
+        """
+        if new_status == Match.STATUS_AWAITING_PLAYERS and old_status != Match.STATUS_AWAITING_PLAYERS:
+            self.add(match)
+        elif old_status == Match.STATUS_AWAITING_PLAYERS and new_status != Match.STATUS_AWAITING_PLAYERS:
+            self.remove(match)
+
+    def add(self, match: Match):
+        """
+        list match at the end of its game's lobby, if it is not listed yet
+        """
+        listing = self._listings.setdefault(match.game_id, _Listing())
+        if match in listing:
+            return
+
+        self._next_seq += 1
+        listing.add(self._next_seq, match)
+        self._notify(match.game_id, "add", self.summary(match))
+
+    def remove(self, match: Match):
+        """
+        unlist match, if it is listed
+        """
+        listing = self._listings.get(match.game_id)
+        if listing is not None and listing.remove(match):
+            self._notify(match.game_id, "remove", {"match-id": match.id, "game-id": match.game_id})
+
+    def list_matches(self, game_id: str, cursor: Optional[int], limit: int) -> dict:
+        """
+        Returns:
+            the list-matches result,
+            {"matches": [summary(match), ...], "next-cursor": cursor to pass for the next page, or None}
+        """
+        listing = self._listings.get(game_id)
+        if listing is None:
+            return {"matches": [], "next-cursor": None}
+
+        page, next_cursor = listing.page(cursor, limit)
+        return {"matches": [self.summary(match) for match in page], "next-cursor": next_cursor}
+
+    @staticmethod
+    def summary(match: Match) -> dict:
+        """
+        what clients get to know about a listed match
+        """
+        return {
+                "match-id": match.id,
+                "game-id": match.game_id,
+                "players": list(match.players),
+                "players-needed": match.players_needed()
+                }
+
+    def subscribe(self, client, game_id: str):
+        """
+        send client a notification for every match of game_id added to or removed from the lobby,
+        replacing any lobby subscription it had
+        """
+        self.unsubscribe(client)
+        self.subscribers.setdefault(game_id, {})[client.websocket] = client
+        client.lobby = game_id
+
+    def unsubscribe(self, client):
+        if client.lobby is not None:
+            self.subscribers[client.lobby].pop(client.websocket, None)
+            client.lobby = None
+
+    def _notify(self, game_id: str, event: str, data: dict):
+        subscribers = self.subscribers.get(game_id)
+        if not subscribers:
+            return
+
+        jsoned_notification = JSON_ENCODER.encode({
+            "type": "notification",
+            "scope": "lobby",
+            "event": event,
+            "data": data
+            })
+        websockets.broadcast(subscribers, jsoned_notification)
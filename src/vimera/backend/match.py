@@ -1,8 +1,17 @@
 """
 Module to hold information for handling Matches
 """
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Callable
 from queue import Queue, Empty
+from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+import copy
+import secrets
+
+import websockets
+
+from common import ErrorCode, OperationError, JSON_ENCODER
+from games import GAMES, Game, run_game_action
 
 
 class Match:
@@ -13,16 +22,21 @@ class Match:
     then that match will handle all of the sending of notifications and interfacing with game logic
 
     players:
-        list of players in the order they joined a match
+        {player name : client} of players in the order they joined a match
+        a player keeps their seat when their connection drops, the client is then None
+        until they come back with resume-session
 
     spectators:
-        list of spectators in the order they joined a match
+        {websocket : client} of spectators in the order they joined a match
 
     id:
         match-id
 
+    game_id:
+        id of the game being played, a key of games.GAMES
+
     game:
-        the actual game that is being played in the match
+        the actual Game that is being played in the match, None until the match starts
 
     status:
         the match status:
@@ -34,6 +48,10 @@ class Match:
             also unknown, for when a match has been instantiated, but nothing has been checked
             against the game logic
 
+    status_listeners:
+        callables taking (match, old status, new status), called every time the status changes.
+        the server's Lobby is one
+
 
     winner:
         whoever the winner is! will be instantiated as None and only updated when
@@ -44,6 +62,24 @@ class Match:
         queue of all notification sent to the match
         done via a queue since notifications could be sent while 
         the match is processing another, since clients are not bound to one thread
+
+    relay:
+        only set on spectator relay servers, where the Match is a local mirror of a match
+        hosted upstream. the RelaySubscription feeding it notifications, see relay.py
+
+    seq:
+        sequence number of the last notification sent, every notification carries its own "seq"
+
+    latest_notification:
+        the last jsoned notification sent, it holds the whole game state so it is
+        all a resuming player or spectator that is behind needs to catch up
+
+    sessions:
+        {session token : player name} for every token handed out to a player of this match
+
+    action_lock:
+        held by the server while it handles a game-action, so that actions of a match
+        (and their notifications) stay in order when some of them are run in an executor
     """
     # https://github.com/uchicago-cs/chimera/blob/e4feef8d35048dc16d7b71d26f88197a0ebcc7db/src/chimera/client/api.py#L107C1-L111C26
     STATUS_AWAITING_PLAYERS = "awaiting-players"
@@ -52,17 +88,28 @@ class Match:
     STATUS_DONE = "done"
     STATUS_UNKNOWN = None
 
-    def __init__(self,match_id:str,game_id:str) -> None:
+    def __init__(self,match_id:str,game_id:Optional[str]) -> None:
         self.players = {}
         self.spectators = {}
 
-        # TODO, change this to a Game object
-
         self.id = match_id
 
-        self.status = Match.STATUS_UNKNOWN
+        self.status_listeners: List[Callable] = []
+        self._status = Match.STATUS_UNKNOWN
+
+        self.game_id = game_id
+        self.game: Optional[Game] = None
 
-        self.game = game_id
+        self.winner = None
+
+        self.relay = None
+
+        self.seq = 0
+        self.latest_notification: Optional[str] = None
+
+        self.sessions: Dict[str, str] = {}
+
+        self.action_lock = asyncio.Lock()
 
         # https://docs.python.org/3/library/queue.html
         # Thread aware First-in-First-out (line of people) queue. 
@@ -79,36 +126,238 @@ class Match:
         #       (just called `Empty` if doing `from queue import Empty`)
         self.notifications = Queue(maxsize=-1)
 
-    def add_player(self,client):
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, new_status):
+        old_status = self._status
+        self._status = new_status
+        if new_status != old_status:
+            for listener in self.status_listeners:
+                listener(self, old_status, new_status)
+
+    def add_player(self,client,player_name:str):
         """
         takes in a Client class of some kind and adds it as a player if possible
 
-        sends error to client if the game is full and/or started
+        raises OperationError if the game is full and/or started, or the name is taken.
+        does not start the match, see is_full() and start()
         """
-        pass
+        if self.status not in (Match.STATUS_UNKNOWN, Match.STATUS_AWAITING_PLAYERS) or self.is_full():
+            raise OperationError(ErrorCode.INCORRECT_MATCH, f"match {self.id} is not accepting players")
+
+        if player_name in self.players:
+            raise OperationError(ErrorCode.DUPLICATE_PLAYER, f"there is already a player named {player_name} in match {self.id}")
+
+        self.players[player_name] = client
+        client.match = self
+        client.player = player_name
+
+        self.status = Match.STATUS_AWAITING_PLAYERS
 
     def add_spectator(self,client):
         """
         takes in a Client class of some kind and adds it as a Spectator
 
-        sends error to client if the game done 
+        raises OperationError if the game done 
+        """
+        if self.status == Match.STATUS_DONE:
+            raise OperationError(ErrorCode.INCORRECT_MATCH, f"match {self.id} is already over")
+
+        self.spectators[client.websocket] = client
+        client.match = self
+
+    def remove_client(self,client):
+        """
+        remove a player or spectator from the match, used when their connection closes
+
+        players keep their seat (with no client) so they can resume-session into it
+        """
+        if client.player is not None and self.players.get(client.player) is client:
+            self.players[client.player] = None
+        else:
+            self.spectators.pop(client.websocket, None)
+
+        client.match = None
+
+    def new_session(self,player_name:str) -> str:
+        """
+        hand out a session token for a player to resume-session with if their connection drops.
+        spectators have no seat to keep, they spectate-match again with the last seq they saw
+        """
+        session_token = secrets.token_urlsafe(16)
+        self.sessions[session_token] = player_name
+        return session_token
+
+    def resume(self,client,session_token:str):
+        """
+        put client back in the seat session_token was handed out for
+
+        if the player's old connection is still attached (the drop was not noticed yet)
+        it is detached, and returned so the caller can close it
+
+        Returns:
+            the client that was previously in the player's seat, if any
+        """
+        player_name = self.sessions[session_token]
+        client.match = self
+
+        previous_client = self.players[player_name]
+        if previous_client is not None:
+            previous_client.match = None
+
+        self.players[player_name] = client
+        client.player = player_name
+        return previous_client
+
+    def notifications_since(self,last_seq:Optional[int]) -> List[str]:
+        """
+        the jsoned notifications to catch up a client that last saw last_seq (None if it saw none)
+
+        every notification holds the whole game state, so however many a client missed
+        only the latest one is sent, and nothing if the client already saw it
+        """
+        if self.latest_notification is None or last_seq == self.seq:
+            return []
+
+        return [self.latest_notification]
+
+    def players_needed(self) -> int:
+        """
+        how many players the game needs to start
+        """
+        return GAMES[self.game_id].players_needed
+
+    def is_full(self) -> bool:
+        """
+        True once enough players have joined for the game to start
+        """
+        return len(self.players) >= self.players_needed()
+
+    def missing_players(self) -> List[str]:
+        """
+        names of the players whose connection dropped and who have not resumed yet
+        """
+        return [player_name for player_name, client in self.players.items() if client is None]
+
+    def is_empty(self) -> bool:
+        """
+        True when nobody is connected to the match anymore
+        """
+        return not self.spectators and all(client is None for client in self.players.values())
+
+    def start(self):
         """
-        pass
+        start the game with the players that have joined so far.
 
-    def process_notification(self,match_notification: MatchNotification):
+        the match is in progress as soon as this returns, the caller sends
+        the "start" notification with notify(MatchNotification.EVENT_START)
+        """
+        self.game = GAMES[self.game_id](list(self.players))
+        self.status = Match.STATUS_IN_PROGRESS
+
+    def game_action(self,player_name:str,action:str,data:dict) -> dict:
+        """
+        pass a game-action on to the game logic
+
+        does not send any notification, call notify_update() once the response has been sent
+
+        Returns:
+            the result for the game-action response
+
+        Raises:
+            OperationError if the match is not in progress or the game logic rejected the action
+        """
+        self._check_in_progress()
+
+        assert self.game is not None
+        return self.game.action(player_name, action, data)
+
+    async def offload_game_action(self,executor:Executor,timeout:float,player_name:str,action:str,data:dict) -> dict:
+        """
+        game_action(), but run in executor so a slow action does not hold up the event loop
+
+        the action runs on a copy of the game (deep copied for a thread pool, pickled into anything else),
+        which only replaces self.game once it finishes in time. an action that times out keeps
+        running in the executor, but its result is thrown away
+
+        Raises:
+            OperationError(GAME_ACTION_TIMEOUT) if the action took longer than timeout seconds,
+            and everything game_action() raises
+        """
+        self._check_in_progress()
+
+        assert self.game is not None
+        # a process pool copies it by pickling
+        game = copy.deepcopy(self.game) if isinstance(executor, ThreadPoolExecutor) else self.game
+
+        future = asyncio.get_running_loop().run_in_executor(executor, run_game_action, game, player_name, action, data)
+        try:
+            game, result = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise OperationError(ErrorCode.GAME_ACTION_TIMEOUT, f"{action} took longer than {timeout} seconds")
+
+        self.game = game
+        return result
+
+    def _check_in_progress(self):
+        if self.status != Match.STATUS_IN_PROGRESS:
+            raise OperationError(ErrorCode.INCORRECT_MATCH, f"match {self.id} is not in progress")
+
+    def notify_update(self):
+        """
+        send the "update" notification, or "end" if the game is over
+        """
+        assert self.game is not None
+        self.notify(MatchNotification.EVENT_END if self.game.done else MatchNotification.EVENT_UPDATE)
+
+    def notify(self,event:str):
+        """
+        build a notification about the current state of the match and process it
+        """
+        assert self.game is not None
+
+        data = {
+                "match-id": self.id,
+                "match-status": Match.STATUS_DONE if self.game.done else Match.STATUS_IN_PROGRESS,
+                "game-id": self.game_id,
+                "game-state": self.game.game_state()
+                }
+        if self.game.done:
+            data["match-winner"] = self.game.winner
+
+        MatchNotification(self, event, data, seq=self.seq + 1).process()
+
+    def process_notification(self,match_notification: "MatchNotification"):
         """
         process a notification, updating interal attributes and sending
         messages to players and spectators as necesary
         """
-        pass
+        if match_notification.match_status is not None:
+            self.status = match_notification.match_status
+
+        if match_notification.winner is not None:
+            self.winner = match_notification.winner
+
+        jsoned_notification = match_notification.jsoned()
+        if match_notification.seq is not None:
+            self.seq = match_notification.seq
+            self.latest_notification = jsoned_notification
+
+        self.broadcast(jsoned_notification)
 
     def broadcast(self,jsoned_message):
         """
         send a message to all players and spectators
 
-        uses websockets.broadcast for spectators 
+        uses websockets.broadcast, so the message is framed once and
+        written to every connection without awaiting each send
         """
-        pass
+        connections = [client.websocket for client in self.players.values() if client is not None]
+        connections.extend(self.spectators)
+        websockets.broadcast(connections, jsoned_message)
 
 
 
@@ -129,24 +378,36 @@ class MatchNotification:
     _match: Match
     _event: str
     _data: dict
+    _seq: Optional[int]
+    _jsoned: Optional[str]
 
-    def __init__(self, match: Match, event: str, data: dict):
+    def __init__(self, match: Match, event: str, data: dict, seq: Optional[int] = None, jsoned: Optional[str] = None):
         """ Constructor
 
         Args:
             match: Match this notification pertains to
             event: Event being notified
             data: Notification data
+            seq: sequence number of the notification within the match
+            jsoned: the notification message as already serialized JSON, if it was received
+                    that way (eg: from upstream on a relay), so it is forwarded as is
         """
         self._match = match
         self._event = event
         self._data = data
+        self._seq = seq
+        self._jsoned = jsoned
 
     @property
     def event(self) -> str:
         """Gets the notification event"""
         return self._event
 
+    @property
+    def seq(self) -> Optional[int]:
+        """Gets the sequence number of the notification"""
+        return self._seq
+
     @property
     def match_status(self) -> Optional[str]:
         """Gets the match status included in the notification"""
@@ -162,6 +423,18 @@ class MatchNotification:
         """Gets the winner included in the notification"""
         return self._data.get("match-winner")
 
+    def jsoned(self) -> str:
+        """Gets the full notification message as JSON, serialized at most once"""
+        if self._jsoned is None:
+            self._jsoned = JSON_ENCODER.encode({
+                "type": "notification",
+                "scope": "match",
+                "event": self._event,
+                "seq": self._seq,
+                "data": self._data
+                })
+        return self._jsoned
+
     def process(self) -> None:
         """ Processes the notification, and updates tha state
         of the match with the information included in the
@@ -0,0 +1,140 @@
+"""
+Module for running a server as a spectator relay
+
+a relay holds no game logic. the first time one of its clients spectates a match,
+the relay spectates that match on its upstream server over a single websocket connection
+and re-broadcasts every notification it receives to its own local spectators.
+upstream can be the authoritative server or another relay, so relays can be chained into a tree
+"""
+import asyncio
+import json
+import logging
+import secrets
+from typing import Optional
+
+import websockets.client
+import websockets.exceptions
+
+from common import ErrorCode, OperationError, JSON_ENCODER
+from match import Match, MatchNotification
+
+
+# how many times a relay tries to spectate a match upstream again after losing the connection,
+# waiting RELAY_RECONNECT_DELAY_SECONDS times the attempt number before each try
+RELAY_RECONNECT_ATTEMPTS = 5
+RELAY_RECONNECT_DELAY_SECONDS = 0.5
+
+
+class RelaySubscription:
+    """
+    one upstream spectator connection feeding a local mirror Match
+
+    if the connection drops before the match is over, the relay spectates it upstream again
+    with the last seq it saw, so it is caught up with the latest notification
+
+    attributes:
+        upstream : websocket URI of the server the match is spectated on
+        match : the local mirror Match, its spectators are the relay's clients
+        subscribed : Future set once upstream answered the first spectate-match request.
+                     its result is None on success, or an OperationError describing
+                     the upstream error response (eg: UNKNOWN_MATCH)
+    """
+    def __init__(self, upstream: str, match: Match) -> None:
+        self.upstream = upstream
+        self.match = match
+        self.subscribed: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._task: Optional[asyncio.Task] = None
+
+        # set by _spectate() once upstream accepted us, so that a connection
+        # that relayed for a while gets the full RELAY_RECONNECT_ATTEMPTS again
+        self._relaying = False
+
+    def start(self, on_finished) -> None:
+        """
+        start the upstream connection in the background
+
+        Inputs:
+            on_finished : callable taking this RelaySubscription, called once relaying stopped
+                          for any reason so the server can drop the mirror. the mirror's status
+                          is done if it stopped because the match ended
+        """
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._task.add_done_callback(lambda _task: on_finished(self))
+
+    def close(self) -> None:
+        """
+        stop relaying, used when the last local spectator left
+        """
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        try:
+            attempt = 0
+            while not await self._spectate():
+                # lost the connection before the match ended
+                attempt = 1 if self._relaying else attempt + 1
+                self._relaying = False
+                if not self.subscribed.done() or attempt > RELAY_RECONNECT_ATTEMPTS:
+                    logging.warning(f"giving up on relaying match {self.match.id} from {self.upstream}")
+                    return
+                await asyncio.sleep(RELAY_RECONNECT_DELAY_SECONDS * attempt)
+
+        finally:
+            if not self.subscribed.done():
+                self.subscribed.set_result(OperationError(ErrorCode.UNKNOWN_MATCH, f"could not spectate match {self.match.id} upstream"))
+
+    async def _spectate(self) -> bool:
+        """
+        spectate the match upstream once, relaying notifications until the connection is gone
+
+        Returns:
+            True once there is nothing left to relay (the match ended, or upstream refused us),
+            False if the connection was lost
+        """
+        request = {
+                "type": "request",
+                "id": f"relay-{secrets.token_hex(4)}",
+                "operation": "spectate-match",
+                "params": {"match-id": self.match.id, "last-seq": self.match.seq}
+                }
+        try:
+            async with websockets.client.connect(self.upstream) as upstream:
+                await upstream.send(JSON_ENCODER.encode(request))
+
+                response = json.loads(await upstream.recv())
+                error = response.get("error")
+                if error is not None:
+                    if not self.subscribed.done():
+                        self.subscribed.set_result(OperationError(ErrorCode(error["code"]), error.get("data", {}).get("details", error["message"])))
+                    logging.warning(f"upstream {self.upstream} refused to relay match {self.match.id}: {error['message']}")
+                    return True
+
+                if not self.subscribed.done():
+                    self.subscribed.set_result(None)
+                self._relaying = True
+                logging.info(f"relaying match {self.match.id} from {self.upstream}")
+
+                async for raw_message in upstream:
+                    message = json.loads(raw_message)
+                    if not isinstance(message, dict) or message.get("type") != "notification":
+                        continue
+
+                    event, data = message["event"], message["data"]
+                    if not isinstance(data, dict):
+                        raise ValueError(f"notification data is not an object: {data!r}")
+
+                    # forwarded as the exact text we received, only parsed to track the match status
+                    MatchNotification(self.match, event, data, seq=message.get("seq"), jsoned=raw_message).process()
+
+                    if event == MatchNotification.EVENT_END:
+                        return True
+
+        except (OSError, websockets.exceptions.WebSocketException) as exc:
+            logging.warning(f"lost upstream {self.upstream} for match {self.match.id}: {exc}")
+
+        except (ValueError, KeyError) as exc:
+            # json.JSONDecodeError is a ValueError
+            logging.warning(f"malformed message from upstream {self.upstream} for match {self.match.id}: {exc!r}")
+
+        return False
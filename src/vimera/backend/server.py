@@ -10,75 +10,57 @@ import signal
 import secrets
 
 import json
+import importlib
 
 import asyncio
 from typing import Optional, Set, Tuple, List, Dict
+from concurrent.futures import Executor, ThreadPoolExecutor
 
-import websockets.client
 import websockets.server
 import websockets.exceptions
 
-from coolname import generate_slug
-
-
+# logging is configured in _configure_logging() when run as a script,
+# importing this module should not touch the root logger
 import logging
-logging.basicConfig(format='[%(asctime)s] %(message)s', datefmt='%I:%M:%S %p', level=logging.DEBUG)
 
 from enum import Enum
 
+from common import ErrorCode, OperationError, JSON_ENCODER
+from games import GAMES
+from match import Match, MatchNotification
+from lobby import Lobby
 
-# https://github.com/uchicago-cs/chimera/blob/e4feef8d35048dc16d7b71d26f88197a0ebcc7db/src/chimera/common/__init__.py#L4
-class ErrorCode(Enum):
-    # General error codes
-    PARSE_ERROR = -32700
-    INCORRECT_REQUEST = -32600
-    NO_SUCH_OPERATION = -32601
-    INCORRECT_PARAMS = -32602
-
-    # Operation-specific codes
-    UNKNOWN_GAME = -40100
-    ALREADY_IN_MATCH = -40101
-    UNKNOWN_MATCH = -40102
-    DUPLICATE_PLAYER = -40103
-    INCORRECT_MATCH = -40104
-
-    # game-action codes
-    GAME_NOT_PLAYER_TURN = -50100
-    GAME_NO_SUCH_ACTION = -50101
-    GAME_INCORRECT_ACTION_DATA = -50102
-    GAME_INCORRECT_MOVE = -50103
-
-    def __str__(self):
-        return ERROR_MESSAGES[self.value]
-
-
-ERROR_MESSAGES = {
-    # General error codes
-    ErrorCode.PARSE_ERROR.value: "Parse error",
-    ErrorCode.INCORRECT_REQUEST.value: "Incorrect request",
-    ErrorCode.NO_SUCH_OPERATION.value: "No such operation",
-    ErrorCode.INCORRECT_PARAMS.value: "Incorrect parameters",
-
-    # Operation-specific codes
-    ErrorCode.UNKNOWN_GAME.value: "Unknown game",
-    ErrorCode.ALREADY_IN_MATCH.value: "Already in a match",
-    ErrorCode.UNKNOWN_MATCH.value: "Unknown match",
-    ErrorCode.DUPLICATE_PLAYER.value: "Duplicate player name",
-    ErrorCode.INCORRECT_MATCH.value: "Incorrect match",
-
-    # game-action codes
-    ErrorCode.GAME_NOT_PLAYER_TURN.value: "Action not allowed outside player's turn",
-    ErrorCode.GAME_NO_SUCH_ACTION.value: "Unsupported action in game",
-    ErrorCode.GAME_INCORRECT_ACTION_DATA.value: "Incorrect data in game action",
-    ErrorCode.GAME_INCORRECT_MOVE.value: "Incorrect move"
-}
 
 # id : description
 # stores all valid game types and their descriptions
 # used to generate urls as well as validate requests sent to server
-VALID_GAMES = {
-        "p1wins" : "player 1 wins"
-        }
+VALID_GAMES = {game_id : game.description for game_id, game in GAMES.items()}
+
+# how long a match where every player and spectator disconnected is kept around
+# for them to resume-session into it before it is dropped
+RESUME_GRACE_SECONDS = 60
+
+# page size of list-matches when the request has no "limit", and the largest one allowed
+LIST_MATCHES_LIMIT = 20
+LIST_MATCHES_MAX_LIMIT = 100
+
+# default for how long a game-action run in the game executor can take
+GAME_ACTION_TIMEOUT_SECONDS = 5.0
+
+# coolname builds its word lists on import, which is a noticeable chunk
+# of startup, so it is only imported the first time a slug is needed
+_generate_slug = None
+
+
+def generate_slug(word_count: int) -> str:
+    """
+    lazily imported wrapper around coolname.generate_slug(word_count)
+    """
+    global _generate_slug
+    if _generate_slug is None:
+        from coolname import generate_slug as coolname_generate_slug
+        _generate_slug = coolname_generate_slug
+    return _generate_slug(word_count)
 
 
 class Operation(Enum):
@@ -91,6 +73,11 @@ class Operation(Enum):
     LIST_GAMES = "list-games"
     GAME_ACTION = "game-action"
 
+    # not part of the chimera message format
+    RESUME_SESSION = "resume-session"
+    LIST_MATCHES = "list-matches"
+    SUBSCRIBE_LOBBY = "subscribe-lobby"
+
 
 class VimeraWebsocketsClient():
     """
@@ -104,6 +91,7 @@ class VimeraWebsocketsClient():
         send_error : send an error message
         send_response : send a reponse
         send_notification : send a notification
+        send_notifications : send notifications that were already serialized by a Match
     """
     def __init__(self,websocket,connection_id=None,player_name=None,match_id=None,) -> None:
         """
@@ -118,12 +106,14 @@ class VimeraWebsocketsClient():
 
             websocket: the actual websocket connection the client is connecting on
             id : the id used to associate any message sent to or from this client, "id" field of the message
+            lobby : Optional[str], the game id whose lobby the client subscribed to with subscribe-lobby, if Any
 
         """
         self.match = match_id
         self.player = player_name
         self.websocket = websocket
         self.id = connection_id
+        self.lobby = None
 
 
 
@@ -142,8 +132,17 @@ class VimeraWebsocketsClient():
             nothing, side affect is to send whatever message to websocket
 
         """
-        jsoned_message = json.dumps(non_jsoned_message,indent=4)
-        logging.info(f"SENDING CLIENT {jsoned_message}")
+        jsoned_message = JSON_ENCODER.encode(non_jsoned_message)
+        await self._send_jsoned_message(jsoned_message)
+
+    async def _send_jsoned_message(self, jsoned_message):
+        """
+        sends an already serialized JSON message to the websocket associated with this client
+
+        Inputs:
+            jsoned_message : str, the JSON text to send
+        """
+        logging.debug("SENDING CLIENT %s", jsoned_message)
         await self.websocket.send(jsoned_message)
 
 
@@ -279,6 +278,27 @@ class VimeraWebsocketsClient():
         response["id"] = self.id
         response["result"] = result
         await self._send_message(non_jsoned_message=response)
+
+    async def send_cached_response(self,jsoned_result: str):
+        """
+        same as send_response, but for results that were already serialized ahead of time
+        (eg: the list-games result, which never changes while the server is running)
+
+        only the "id" still needs encoding, the rest of the message is spliced together as text
+
+        Inputs:
+            jsoned_result : str, JSON text of the "result" member
+        """
+        jsoned_id = JSON_ENCODER.encode(self.id)
+        await self._send_jsoned_message('{"type":"response","id":' + jsoned_id + ',"result":' + jsoned_result + '}')
+
+    async def send_notifications(self,jsoned_notifications: List[str]):
+        """
+        send already serialized notifications, in order.
+        used to catch up spectators and resuming clients from Match.notifications_since()
+        """
+        for jsoned_notification in jsoned_notifications:
+            await self._send_jsoned_message(jsoned_notification)
         
     async def send_error(self,error_code: ErrorCode,data=None):
         """
@@ -331,13 +351,29 @@ class VimeraWebsocketsServer():
     
     will be handling all connections
     """
-    def __init__(self, address, port) -> None:
+    def __init__(self, address, port, upstream: Optional[str] = None,
+                 game_executor: Optional[Executor] = None, game_action_timeout: float = GAME_ACTION_TIMEOUT_SECONDS) -> None:
         """
         given address and port for arguments to websockets.serve()
         eg: 127.0.0.1:8000 --> addr : 127.0.0.1 , port : 8000
+
+        upstream : websocket URI of another server (eg: ws://game-server:8001).
+                   when given, this server runs as a spectator relay for it:
+                   it only accepts list-games and spectate-match, and spectating a match
+                   subscribes to it upstream once, however many local spectators there are.
+                   see relay.py
+
+        game_executor : thread or process pool to run the cpu_bound_actions of games in.
+                        when None every game-action runs on the event loop
+        game_action_timeout : seconds an action in the game executor gets before the player
+                              gets a GAME_ACTION_TIMEOUT error
         """
         self.address = address
         self.port = port
+        self.upstream = upstream
+
+        self.game_executor = game_executor
+        self.game_action_timeout = game_action_timeout
 
         # task for the server to work on, where the event loop is stored
         self._server_task = None
@@ -350,6 +386,11 @@ class VimeraWebsocketsServer():
         # Future to await for the server to stop
         self._stop = None
 
+        # pre-serialized "result" members for responses that never change
+        # while the server is running, filled in by _warm_up()
+        # {operation : jsoned result}
+        self._cached_results: Dict[str, str] = {}
+
 
         # dictionary that stores which clients are associated with what websockets
         # Clients are classes that are meant to handle messages in some way
@@ -357,30 +398,30 @@ class VimeraWebsocketsServer():
         self.clients = {}
         
         # dictionary that maps all valid game id's to their corresponding Game base class object
-        # for player 1 wins, not useful yet
-        self.games = {}
+        self.games = GAMES
 
-        # dictionary that maps match-id's to a list of all the websockets
-        # associated with  a particular match
+        # dictionary that maps match-id's to the Match holding all the clients
+        # associated with a particular match.
+        # on a relay these are local mirrors of the upstream matches being spectated
+        # {match_id : Match}
+        self.matches: Dict[str, Match] = {}
 
-        """
-        format is:
-            matches["match_id"] = {
-                    "playing": [list of websockets playing]
-                    "watching": [list of websockets watching]
-                    }
-        """
-        self.matches = {}
+        # every session token handed out, to find the match for a resume-session
+        # {session token : Match}
+        self.sessions: Dict[str, Match] = {}
 
-        # self.matches["abcdef"] = {
-        #         "playing": [1,2],
-        #         "watching": [3,4]
-        #         }
+        # the matches awaiting players per game, for list-matches and subscribe-lobby
+        self.lobby = Lobby()
 
         # event loop to handle the creation of Futures
         # preffered way to create futures: https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.create_future
         self._event_loop = asyncio.get_running_loop()
 
+        # created here rather than in start() so that code running the server
+        # in the background can wait_until_ready() and stop() it
+        self._ready_to_accept_messages = self._event_loop.create_future()
+        self._stop = self._event_loop.create_future()
+
     async def start(self):
         """
         method to actually start a server.
@@ -390,8 +431,9 @@ class VimeraWebsocketsServer():
 
         stop attribute is the future corresponding to the server being done and shutting down
         """
-        self._ready_to_accept_messages = self._event_loop.create_future()
-        self._stop = self._event_loop.create_future()
+        # do all the one time work before we start listening,
+        # so the first connections don't pay for it
+        self._warm_up()
 
         # schedule a run of the _serve method() 
         # this will contain the actual async for loop accepting messages
@@ -411,11 +453,48 @@ class VimeraWebsocketsServer():
         # start will be finished when the future is done
         await self._ready_to_accept_messages
 
+    async def wait_until_ready(self):
+        """
+        wait for a server running start() in the background to accept connections.
+        if it was created with port 0, self.port is the port it actually got afterwards
+        """
+        await self._ready_to_accept_messages
+
+    def stop(self):
+        """
+        make start() return, closing every connection
+        """
+        if not self._stop.done():
+            self._stop.set_result(True)
+
+    def _warm_up(self):
+        """
+        pay for lazy imports and first-use costs up front, before the server reports
+        that it is ready through _ready_to_accept_messages
+
+            - imports coolname and generates a throwaway slug
+            - runs the shared JSON encoder and the decoder once
+            - fills in the static response caches (list-games)
+            - on a relay, imports the relay module (and with it the websockets client)
+        """
+        generate_slug(3)
+
+        if self.upstream is not None:
+            importlib.import_module("relay")
+
+        json.loads(JSON_ENCODER.encode({"type": "response", "id": None, "result": {}}))
+
+        games = [{"id": game_id, "description": description} for game_id, description in VALID_GAMES.items()]
+        self._cached_results[Operation.LIST_GAMES.value] = JSON_ENCODER.encode({"games": games})
+
     async def _serve(self):
         """
         method that actually handles requests
         """
-        async with websockets.server.serve(self._handler,self.address,self.port):
+        async with websockets.server.serve(self._handler,self.address,self.port) as websocket_server:
+            # in case we were asked for any free port (0)
+            self.port = websocket_server.sockets[0].getsockname()[1]
+
             # now that we're able to serve requests, update our futures
             self._ready_to_accept_messages.set_result(True)
             logging.info(f"Vimera Server listening on {self.address} on port {self.port}")
@@ -434,11 +513,7 @@ class VimeraWebsocketsServer():
             # accept messages until connection is closed
             try:
                 async for raw_message in websocket:
-                    # FOR DEBUG PRINTING PURPOSES
-                    # ADDS INDENTS FOR SIGNIFICANTLY BETTER PRINTING
-                    raw_message = json.dumps(json.loads(raw_message),indent=2)
-
-                    logging.info(f"FROM {client} RCVD : {raw_message}")
+                    logging.debug("FROM %s RCVD : %s", client, raw_message)
                     await self.parse(client,raw_message)
 
             except websockets.exceptions.ConnectionClosed as exc:
@@ -448,12 +523,15 @@ class VimeraWebsocketsServer():
             # unregister client
             del self.clients[websocket]
 
-            # not sure what to do with client struct for unregistering
-            # right now trust that the garbage collector does its job
-            # however, https://www.evanjones.ca/memoryallocator/, 
-            # and https://stackoverflow.com/questions/31089451/force-python-to-release-objects-to-free-up-memory
-            # makes me unsure
-            
+            if client.match is not None:
+                self._leave_match(client)
+
+            self.lobby.unsubscribe(client)
+
+            # nothing else holds on to the client: self.clients, its match and the lobby
+            # were the only references to it. benchmarks/memory_soak.py churns connections
+            # and fails if any VimeraWebsocketsClient, Match or MatchNotification outlives them.
+            # RSS can still sit above what is live, see https://www.evanjones.ca/memoryallocator/
 
     async def parse(self,client: VimeraWebsocketsClient,raw_message):
         """
@@ -479,17 +557,6 @@ class VimeraWebsocketsServer():
         """
 
         # First, validate the message has all correct fields
-        try:
-            message = json.loads(raw_message)
-        except json.JSONDecodeError as json_exc:
-            error_details = f"Incorrect JSON (parsing failed at line {json_exc.lineno} column {json_exc.colno})"
-            await client.send_error(
-                                    error_code=ErrorCode.PARSE_ERROR,
-                                    data={"details": error_details}
-                                    )
-            return
-
-
         # https://github.com/uchicago-cs/chimera/blob/e4feef8d35048dc16d7b71d26f88197a0ebcc7db/src/chimera/backend/server.py#L160
         try:
             message = json.loads(raw_message)
@@ -562,7 +629,23 @@ class VimeraWebsocketsServer():
         # to send to Client.send_response()
         result = {}
 
-        message_params = message.get("params)")
+        message_params = message.get("params")
+
+        # every request besides list-games must have a params object
+        if operation != Operation.LIST_GAMES.value and not isinstance(message_params, dict):
+            await client.send_error(
+                                    error_code=ErrorCode.INCORRECT_PARAMS,
+                                    data={"details": "No params object specified"}
+                                    )
+            return
+
+        # relays only know about spectating, everything else happens on the upstream server
+        if self.upstream is not None and operation not in (Operation.LIST_GAMES.value, Operation.SPECTATE_MATCH.value):
+            await client.send_error(
+                                    error_code=ErrorCode.NO_SUCH_OPERATION,
+                                    data={"details": f"this server only relays spectators, send {operation} to {self.upstream}"}
+                                    )
+            return
 
         try:
             logging.debug(f"\n\ngot to operation parsing with operation: {operation}")
@@ -570,41 +653,94 @@ class VimeraWebsocketsServer():
                 case Operation.CREATE_MATCH.value:
                     logging.debug(f"{client} trying to Create Match")
 
-                    # create match only sends back match-id
-                    # thanks coolname
-                    match_id = generate_slug(3)
+                    # create match sends back match-id, and the session-token to resume-session with
+                    match = self.create_match(client, message_params)
 
-                    result["match-id"] = match_id
+                    result["match-id"] = match.id
+                    result["session-token"] = self._new_session(match, client.player)
 
                     await client.send_response(result)
                     
                 case Operation.JOIN_MATCH.value:
                     logging.debug(f"{client} trying to Join Match")
 
-                    # join_match needs nothing if it was successful
+                    match = self.join_match(client, message_params)
+
+                    # started before the response goes out, so that nobody
+                    # can send a game-action to a full match that is not in progress yet
+                    starting = match.is_full()
+                    if starting:
+                        match.start()
+
+                    # join_match only needs the session-token if it was successful
+                    result["session-token"] = self._new_session(match, client.player)
                     await client.send_response(result)
 
+                    # the start notification goes out after the response
+                    if starting:
+                        match.notify(MatchNotification.EVENT_START)
+
                 case Operation.SPECTATE_MATCH.value:
                     logging.debug(f"{client} trying to Spectate Match")
 
-                    # spectate similarly only needs nothing if it was successful
+                    # spectators have no seat to resume, one whose connection dropped
+                    # spectates again with the last seq it saw to be caught up
+                    catching_up = "last-seq" in message_params
+                    last_seq = self._get_last_seq(message_params)
+
+                    match = await self.spectate_match(client, message_params)
+
+                    # spectate similarly only sends back an empty result
+                    await client.send_response(result)
+
+                    if catching_up:
+                        await client.send_notifications(match.notifications_since(last_seq))
+
+                case Operation.RESUME_SESSION.value:
+                    logging.debug(f"{client} trying to Resume Session")
+
+                    last_seq = self._get_last_seq(message_params)
+                    match = self.resume_session(client, message_params)
+
+                    result["match-id"] = match.id
                     await client.send_response(result)
 
+                    # the latest notification, unless they already saw it
+                    await client.send_notifications(match.notifications_since(last_seq))
+
                 case Operation.LIST_GAMES.value:
                     logging.debug(f"{client} trying to List Games")
 
-                    # games_for_list_games = self.list_games()
-                    games_for_list_games = [{"id":"p1wins","description":"player 1 wins that's literally it"}]
-                    result["games"] = games_for_list_games
+                    # built once from VALID_GAMES in _warm_up()
+                    await client.send_cached_response(self._cached_results[Operation.LIST_GAMES.value])
+
+                case Operation.LIST_MATCHES.value:
+                    logging.debug(f"{client} trying to List Matches")
+
+                    result = self.list_matches(message_params)
 
                     await client.send_response(result)
 
+                case Operation.SUBSCRIBE_LOBBY.value:
+                    logging.debug(f"{client} trying to Subscribe to the Lobby")
+
+                    self.lobby.subscribe(client, self._get_game_id(message_params))
+
+                    # nothing to send back, the lobby notifications follow as matches come and go
+                    await client.send_response(result)
+
                 case Operation.GAME_ACTION.value:
                    logging.debug(f"{client} trying to perform a Game Action with params {message_params}")
 
-                   result["game-specific-action-info"] = "totally recieved feedback for a game-action :)"
+                   match = self._get_client_match(client, message_params)
 
-                   await client.send_response(result)
+                   # one action at a time per match, even while one is off in the executor
+                   async with match.action_lock:
+                       result = await self.game_action(match, client.player, message_params.get("action"), message_params.get("data", {}))
+
+                       await client.send_response(result)
+
+                       match.notify_update()
 
                 case _:
                     await client.send_error(
@@ -614,16 +750,383 @@ class VimeraWebsocketsServer():
                     return
                     
 
+        except OperationError as err:
+            await client.send_error(
+                                    error_code=err.error_code,
+                                    data={"details": err.details}
+                                    )
+
         except Exception as err:
             # Handle any errors that may occur
             logging.error(f"Exception [{err}] raised during operation parsing")
 
-        
+    @staticmethod
+    def _get_match_id(params) -> str:
+        """
+        returns the "match-id" param, raising OperationError(INCORRECT_PARAMS) if it is not a string
+        """
+        match_id = params.get("match-id")
+        if not isinstance(match_id, str):
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "match-id must be a string")
+        return match_id
+
+    def _get_match(self, params) -> Match:
+        """
+        look up the match named by the "match-id" param
+
+        raises OperationError(UNKNOWN_MATCH) if there is no such match
+        """
+        match_id = self._get_match_id(params)
+        match = self.matches.get(match_id)
+        if match is None:
+            raise OperationError(ErrorCode.UNKNOWN_MATCH, f"there is no match with id [{match_id}]")
+        return match
+
+    def _get_client_match(self, client: VimeraWebsocketsClient, params) -> Match:
+        """
+        check that the "match-id" and "player-name" params of a game-action
+        are the match and player the client joined as
+
+        raises OperationError(INCORRECT_MATCH) otherwise
+        """
+        match = self._get_match(params)
+        if client.match is not match or client.player is None or client.player != params.get("player-name"):
+            raise OperationError(ErrorCode.INCORRECT_MATCH, f"not playing in match {match.id} as {params.get('player-name')}")
+        return match
+
+    @staticmethod
+    def _check_not_in_match(client: VimeraWebsocketsClient):
+        """
+        raises OperationError(ALREADY_IN_MATCH) if client already is in a match
+        """
+        if client.match is not None:
+            raise OperationError(ErrorCode.ALREADY_IN_MATCH, f"already in match {client.match.id}")
+
+    @staticmethod
+    def _get_player_name(params) -> str:
+        """
+        returns the "player-name" param, raising OperationError(INCORRECT_PARAMS) if it is missing
+        """
+        player_name = params.get("player-name")
+        if not isinstance(player_name, str) or not player_name:
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "No player-name specified")
+        return player_name
+
+    @staticmethod
+    def _get_last_seq(params) -> Optional[int]:
+        """
+        returns the "last-seq" param (None if left out), raising OperationError(INCORRECT_PARAMS) if it is not an integer
+        """
+        last_seq = params.get("last-seq")
+        # bool is a subclass of int
+        if last_seq is not None and (not isinstance(last_seq, int) or isinstance(last_seq, bool)):
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "last-seq must be an integer")
+        return last_seq
+
+    async def game_action(self, match: Match, player_name: str, action, data) -> dict:
+        """
+        run a game-action, in the game executor if the game declared the action as cpu bound
+
+        Returns:
+            the result for the game-action response
+        """
+        if self.game_executor is not None and action in match.game.cpu_bound_actions:
+            return await match.offload_game_action(self.game_executor, self.game_action_timeout, player_name, action, data)
+
+        return match.game_action(player_name, action, data)
+
+    def _get_game_id(self, params) -> str:
+        """
+        returns the "game" param, raising OperationError(UNKNOWN_GAME) if it is not a game we host
+        """
+        game_id = params.get("game")
+        if not isinstance(game_id, str):
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "game must be a string")
+        if game_id not in self.games:
+            raise OperationError(ErrorCode.UNKNOWN_GAME, f"there is no game with id [{game_id}]")
+        return game_id
+
+    def list_matches(self, params) -> dict:
+        """
+        a page of the matches of params["game"] that are awaiting players, oldest first.
+
+        params["cursor"] is the "next-cursor" of the previous page (leave it out for the first page),
+        params["limit"] the page size
+
+        Returns:
+            the list-matches result, see Lobby.list_matches()
+        """
+        game_id = self._get_game_id(params)
+
+        cursor = params.get("cursor")
+        limit = params.get("limit", LIST_MATCHES_LIMIT)
+        # bool is a subclass of int
+        if (cursor is not None and (not isinstance(cursor, int) or isinstance(cursor, bool))) \
+                or not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "cursor and limit must be integers, limit at least 1")
+
+        return self.lobby.list_matches(game_id, cursor, min(limit, LIST_MATCHES_MAX_LIMIT))
+
+    def create_match(self, client: VimeraWebsocketsClient, params) -> Match:
+        """
+        create a new match of params["game"] with client as its first player
+
+        Returns:
+            the new Match
+        """
+        game_id = self._get_game_id(params)
+
+        player_name = self._get_player_name(params)
+        self._check_not_in_match(client)
+
+        # thanks coolname
+        match_id = generate_slug(3)
+        while match_id in self.matches:
+            match_id = generate_slug(3)
+
+        match = Match(match_id, game_id)
+        match.status_listeners.append(self.lobby.match_status_changed)
+        match.add_player(client, player_name)
+        self.matches[match_id] = match
+
+        return match
+
+    def join_match(self, client: VimeraWebsocketsClient, params) -> Match:
+        """
+        add client to the match named by params["match-id"] as a player
+
+        Returns:
+            the joined Match, which the caller should start() if it is_full()
+        """
+        match = self._get_match(params)
+        player_name = self._get_player_name(params)
+        self._check_not_in_match(client)
+
+        # it would start with them to move and nobody could play
+        missing_players = match.missing_players()
+        if missing_players:
+            raise OperationError(ErrorCode.INCORRECT_MATCH, f"match {match.id} is waiting for {', '.join(missing_players)} to come back")
+
+        match.add_player(client, player_name)
+        return match
+
+    async def spectate_match(self, client: VimeraWebsocketsClient, params) -> Match:
+        """
+        add client to the match named by params["match-id"] as a spectator
+
+        on a relay, the first spectator of a match subscribes to it upstream
+        and waits for upstream to accept
+
+        Returns:
+            the spectated Match
+        """
+        self._check_not_in_match(client)
+
+        if self.upstream is None:
+            match = self._get_match(params)
+            match.add_spectator(client)
+            return match
+
+        match_id = self._get_match_id(params)
+        match = self.matches.get(match_id)
+        if match is None:
+            # only imported when running as a relay, it pulls in the websockets client
+            from relay import RelaySubscription
+
+            match = Match(match_id, None)
+            match.relay = RelaySubscription(self.upstream, match)
+            self.matches[match_id] = match
+            match.relay.start(self._relay_finished)
+
+        subscribe_error = await match.relay.subscribed
+        if subscribe_error is not None:
+            raise subscribe_error
+
+        match.add_spectator(client)
+        return match
+
+    def _new_session(self, match: Match, player_name: str) -> str:
+        """
+        hand out a session token for a player of match
+        """
+        session_token = match.new_session(player_name)
+        self.sessions[session_token] = match
+        return session_token
+
+    def resume_session(self, client: VimeraWebsocketsClient, params) -> Match:
+        """
+        put client back into the match and seat params["session-token"] was handed out for.
+        session tokens are only handed out to players, so there are at most players_needed() per match
+
+        Returns:
+            the resumed Match
+        """
+        self._check_not_in_match(client)
+
+        session_token = params.get("session-token")
+        if not isinstance(session_token, str):
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "session-token must be a string")
+        match = self.sessions.get(session_token)
+        if match is None:
+            raise OperationError(ErrorCode.INCORRECT_PARAMS, "unknown or expired session-token")
+
+        previous_client = match.resume(client, session_token)
+        if previous_client is not None:
+            # the old connection of a player that came back before we noticed it dropped
+            self._event_loop.create_task(previous_client.websocket.close())
+
+        # _leave_match() unlisted it while they were gone
+        if match.status == Match.STATUS_AWAITING_PLAYERS and not match.missing_players():
+            self.lobby.add(match)
+
+        return match
+
+    def _relay_finished(self, relay):
+        """
+        called once the upstream subscription of a mirror stopped
+
+        if the match ended, the mirror is kept for its spectators like any finished match,
+        and dropped by _leave_match() once the last of them left.
+        otherwise the relay gave up on upstream, so every local spectator is detached and their
+        connection closed. clients then reconnect (spectate-match with the last seq they saw)
+        instead of sitting on a mirror that gets no more notifications
+        """
+        match = relay.match
+        if match.status == Match.STATUS_DONE and not match.is_empty():
+            return
+
+        for client in list(match.spectators.values()):
+            match.remove_client(client)
+            self._event_loop.create_task(client.websocket.close(code=1011, reason="lost the upstream server"))
+
+        self._drop_match(match)
+
+    def _leave_match(self, client: VimeraWebsocketsClient):
+        """
+        remove a disconnected client from its match.
+
+        once nobody is left in it the match is dropped, right away if it is over,
+        otherwise after RESUME_GRACE_SECONDS if nobody resumed into it by then.
+        a match awaiting players is unlisted from the lobby as soon as one of its players is gone,
+        resume_session() lists it again
+        """
+        match = client.match
+        match.remove_client(client)
+
+        if match.status == Match.STATUS_AWAITING_PLAYERS and match.missing_players():
+            self.lobby.remove(match)
+
+        if match.is_empty():
+            if match.status == Match.STATUS_DONE:
+                self._drop_match(match)
+            else:
+                self._event_loop.call_later(RESUME_GRACE_SECONDS, self._drop_match_if_empty, match)
+
+    def _drop_match_if_empty(self, match: Match):
+        if match.is_empty():
+            self._drop_match(match)
+
+    def _drop_match(self, match: Match):
+        """
+        forget a match and every session token of it,
+        and on a relay stop its upstream subscription
+        """
+        if match.relay is not None:
+            match.relay.close()
+
+        if self.matches.get(match.id) is match:
+            del self.matches[match.id]
+
+        self.lobby.remove(match)
+
+        for session_token in match.sessions:
+            self.sessions.pop(session_token, None)
+
+
+def _configure_logging():
+    """
+    set up the root logger, level is taken from the LOG_LEVEL environment variable (default INFO)
+
+    DEBUG logs every message sent and received, as well as the websockets
+    library's own frame level logging, so it is very slow under load
+    """
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(format='[%(asctime)s] %(message)s', datefmt='%I:%M:%S %p', level=level)
+
+
+def _event_loop_factory():
+    """
+    pick the event loop implementation from the EVENT_LOOP environment variable
+
+        "asyncio" (default) : the standard library loop
+        "uvloop" : uvloop's loop, if uvloop is installed.
+                   falls back to the standard loop with a warning otherwise
+
+    Returns:
+        a loop factory for asyncio.Runner, or None for the default loop
+    """
+    requested_loop = os.environ.get("EVENT_LOOP", "asyncio").lower()
+
+    if requested_loop == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("EVENT_LOOP=uvloop but uvloop is not installed, using the asyncio event loop")
+            return None
+        return uvloop.new_event_loop
+
+    if requested_loop != "asyncio":
+        logging.warning(f"unknown EVENT_LOOP [{requested_loop}], using the asyncio event loop")
+
+    return None
+
+
+def _game_executor() -> Optional[Executor]:
+    """
+    build the executor for cpu bound game actions from the environment
+
+        GAME_EXECUTOR : "thread" (default), "process", or "none" to run every action on the event loop.
+                        threads keep the loop responsive between GIL switches, only processes
+                        actually run pure python game logic in parallel
+        GAME_EXECUTOR_WORKERS : pool size, defaults to what concurrent.futures picks
+    """
+    kind = os.environ.get("GAME_EXECUTOR", "thread").lower()
+    workers = os.environ.get("GAME_EXECUTOR_WORKERS")
+    workers = int(workers) if workers else None
+
+    if kind == "none":
+        return None
+
+    if kind == "process":
+        # only imported when asked for, it pulls in multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=workers)
+
+    if kind != "thread":
+        logging.warning(f"unknown GAME_EXECUTOR [{kind}], using a thread pool")
+
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="game-action")
+
 
 async def main():
     port = int(os.environ.get("PORT","8001"))
-    vs = VimeraWebsocketsServer("",port)
-    await vs.start()
+
+    # set to run as a spectator relay of another server
+    upstream = os.environ.get("UPSTREAM")
+
+    game_action_timeout = float(os.environ.get("GAME_ACTION_TIMEOUT", GAME_ACTION_TIMEOUT_SECONDS))
+
+    # relays never run game logic
+    game_executor = _game_executor() if upstream is None else None
+
+    vs = VimeraWebsocketsServer("",port,upstream=upstream,game_executor=game_executor,game_action_timeout=game_action_timeout)
+    try:
+        await vs.start()
+    finally:
+        if game_executor is not None:
+            game_executor.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    _configure_logging()
+    with asyncio.Runner(loop_factory=_event_loop_factory()) as runner:
+        runner.run(main())
@@ -0,0 +1,219 @@
+"""
+Module for playing matches headlessly, without the server or any sockets
+
+bots play whole matches through the same Match / MatchNotification code the server uses,
+batches of matches are spread over a ProcessPoolExecutor, and the results are summed up.
+played matches can be recorded as traces for benchmarks/loadgen.py to replay against a real server
+
+usage:
+    python simulator.py [--game p1wins] [--matches 100000] [--workers 4] [--trace traces.jsonl]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from common import OperationError
+from games import GAMES
+from match import Match, MatchNotification
+
+
+class HeadlessMatch(Match):
+    """
+    a Match whose broadcasts are counted instead of sent anywhere
+    """
+    def __init__(self, match_id: str, game_id: str) -> None:
+        super().__init__(match_id, game_id)
+        self.messages_sent = 0
+
+    def broadcast(self, jsoned_message):
+        self.messages_sent += 1
+
+
+class Bot:
+    """
+    stands in for a VimeraWebsocketsClient, picks a random legal action when it is its turn.
+
+    with probability mistake_rate it sends an action the game should reject instead,
+    so the error paths get played too
+    """
+    def __init__(self, name: str, rng: random.Random, mistake_rate: float) -> None:
+        self.match = None
+        self.player = None
+        self.websocket = None
+        self.name = name
+        self._rng = rng
+        self._mistake_rate = mistake_rate
+
+    def choose_action(self, match: Match):
+        legal_actions = match.game.legal_actions(self.name)
+        if legal_actions and self._rng.random() >= self._mistake_rate:
+            return self._rng.choice(legal_actions)
+        return ("not-an-action", {})
+
+
+def simulate_match(game_id: str, seed: int, mistake_rate: float = 0.0, max_actions: int = 10_000) -> Dict:
+    """
+    play one match of game_id between bots
+
+    Returns:
+        {
+            "winner": seat index of the winner (0 is the match creator), None for no winner,
+            "moves": actions the game accepted,
+            "rejected": actions the game rejected,
+            "notifications": notifications the match sent,
+            "trace": the game-action requests in the order they were sent, see run_batch()
+        }
+    """
+    rng = random.Random(seed)
+    game = GAMES[game_id]
+    bots = [Bot(f"bot-{seat}", rng, mistake_rate) for seat in range(game.players_needed)]
+
+    match = HeadlessMatch(f"sim-{seed}", game_id)
+    for bot in bots:
+        match.add_player(bot, bot.name)
+    match.start()
+    match.notify(MatchNotification.EVENT_START)
+
+    trace = []
+    moves = 0
+    rejected = 0
+    while match.status != Match.STATUS_DONE and moves + rejected < max_actions:
+        for bot in bots:
+            if match.status == Match.STATUS_DONE:
+                break
+            if not match.game.legal_actions(bot.name) and rng.random() >= mistake_rate:
+                continue
+
+            action, data = bot.choose_action(match)
+            trace.append({"player": bot.name, "action": action, "data": data})
+            try:
+                match.game_action(bot.name, action, data)
+            except OperationError:
+                rejected += 1
+                continue
+
+            moves += 1
+            match.notify_update()
+
+    winner = match.game.winner
+    return {
+            "winner": None if winner is None else match.game.players.index(winner),
+            "moves": moves,
+            "rejected": rejected,
+            "notifications": match.messages_sent,
+            "trace": {"game": game_id, "players": [bot.name for bot in bots], "actions": trace}
+            }
+
+
+def _simulate_chunk(game_id: str, first_seed: int, count: int, mistake_rate: float, traces_wanted: int) -> Dict:
+    """
+    worker process entry point, plays matches first_seed .. first_seed + count - 1
+
+    Returns:
+        the summed up results of the chunk, with at most traces_wanted traces
+    """
+    wins = Counter()
+    totals = Counter()
+    traces = []
+
+    start = time.process_time()
+    for seed in range(first_seed, first_seed + count):
+        result = simulate_match(game_id, seed, mistake_rate)
+        wins[result["winner"]] += 1
+        totals["moves"] += result["moves"]
+        totals["rejected"] += result["rejected"]
+        totals["notifications"] += result["notifications"]
+        if len(traces) < traces_wanted:
+            traces.append(result["trace"])
+
+    return {"wins": wins, "totals": totals, "cpu_seconds": time.process_time() - start, "traces": traces}
+
+
+def run_batch(game_id: str, matches: int, workers: int, chunk_size: int = 1000, mistake_rate: float = 0.0,
+              seed: int = 0, trace_path: Optional[str] = None, trace_matches: int = 100) -> Dict:
+    """
+    play `matches` matches spread over a pool of `workers` processes
+
+    Inputs:
+        game_id : key of games.GAMES
+        matches : number of matches to play
+        workers : size of the process pool
+        chunk_size : matches per task handed to a worker
+        mistake_rate : chance of a bot sending an action that gets rejected
+        seed : seed of the first match, match n is played with seed + n
+        trace_path : if given, the first trace_matches matches are written there as JSON lines of
+                     {"game": game id, "players": [names in join order],
+                      "actions": [{"player": name, "action": action, "data": data}, ...]}
+
+    Returns:
+        aggregate results, see main() for how they are reported
+    """
+    wins = Counter()
+    totals = Counter()
+    cpu_seconds = 0.0
+    traces: List[Dict] = []
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for first_seed in range(seed, seed + matches, chunk_size):
+            count = min(chunk_size, seed + matches - first_seed)
+            traces_wanted = max(0, trace_matches - (first_seed - seed)) if trace_path is not None else 0
+            futures.append(pool.submit(_simulate_chunk, game_id, first_seed, count, mistake_rate, traces_wanted))
+
+        for future in futures:
+            chunk = future.result()
+            wins.update(chunk["wins"])
+            totals.update(chunk["totals"])
+            cpu_seconds += chunk["cpu_seconds"]
+            traces.extend(chunk["traces"])
+    elapsed = time.perf_counter() - start
+
+    if trace_path is not None:
+        with open(trace_path, "w") as trace_file:
+            for trace in traces[:trace_matches]:
+                trace_file.write(json.dumps(trace) + "\n")
+
+    actions = totals["moves"] + totals["rejected"]
+    return {
+            "matches": matches,
+            "elapsed": elapsed,
+            "win_rates": {seat: count / matches for seat, count in sorted(wins.items(), key=lambda item: (item[0] is None, item[0]))},
+            "moves_per_match": totals["moves"] / matches,
+            "rejected_per_match": totals["rejected"] / matches,
+            "notifications_per_match": totals["notifications"] / matches,
+            "actions_per_second_per_core": actions / cpu_seconds if cpu_seconds else 0.0,
+            "actions_per_second": actions / elapsed
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--game", default="p1wins", choices=sorted(GAMES))
+    parser.add_argument("--matches", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--mistake-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", default=None, help="file to write match traces to, as JSON lines")
+    parser.add_argument("--trace-matches", type=int, default=100)
+    args = parser.parse_args()
+
+    results = run_batch(args.game, args.matches, args.workers, args.chunk_size, args.mistake_rate,
+                        args.seed, args.trace, args.trace_matches)
+
+    print(f"{results['matches']} matches of {args.game} in {results['elapsed']:.2f} s on {args.workers} workers")
+    for seat, rate in results["win_rates"].items():
+        print(f"  win rate {'no winner' if seat is None else f'seat {seat}'} : {rate:.3f}")
+    print(f"  moves/match {results['moves_per_match']:.2f}  rejected/match {results['rejected_per_match']:.2f}"
+          f"  notifications/match {results['notifications_per_match']:.2f}")
+    print(f"  actions/s {results['actions_per_second']:.0f}  actions/s per core {results['actions_per_second_per_core']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
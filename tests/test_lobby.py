@@ -0,0 +1,140 @@
+"""
+lobby listing and how abandoned matches leave it
+
+run from the repo root with `python -m pytest tests`
+"""
+import asyncio
+import json
+import os
+import sys
+
+import websockets.client
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "vimera", "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from lobby import _Listing  # noqa: E402
+from server import VimeraWebsocketsServer  # noqa: E402
+
+# seconds to wait for a message that should come right away
+TIMEOUT = 5
+
+
+class FakeMatch:
+    def __init__(self, match_id: str) -> None:
+        self.id = match_id
+
+
+def test_page_skips_removed_matches():
+    listing = _Listing()
+    matches = [FakeMatch(f"m{i}") for i in range(10)]
+    for seq, match in enumerate(matches, start=1):
+        listing.add(seq, match)
+    for match in matches[1:9:2]:
+        listing.remove(match)
+
+    page, cursor = listing.page(None, 3)
+    assert [match.id for match in page] == ["m0", "m2", "m4"]
+    page, cursor = listing.page(cursor, 3)
+    assert [match.id for match in page] == ["m6", "m8", "m9"]
+    assert cursor is None
+
+
+def test_cursor_of_a_removed_match_still_pages():
+    listing = _Listing()
+    matches = [FakeMatch(f"m{i}") for i in range(4)]
+    for seq, match in enumerate(matches, start=1):
+        listing.add(seq, match)
+
+    page, cursor = listing.page(None, 2)
+    assert cursor == 2
+    listing.remove(matches[1])
+    listing.remove(matches[2])
+
+    page, cursor = listing.page(cursor, 2)
+    assert [match.id for match in page] == ["m3"]
+    assert cursor is None
+
+
+def test_compaction_drops_stale_seqs():
+    listing = _Listing()
+    matches = [FakeMatch(f"m{i}") for i in range(100)]
+    for seq, match in enumerate(matches, start=1):
+        listing.add(seq, match)
+    for match in matches[:-5]:
+        listing.remove(match)
+
+    # compacted once on the way down, then left alone under the threshold
+    assert len(listing.seqs) < 100
+    assert len(listing.seqs) <= 2 * len(listing.matches) + 32
+    page, cursor = listing.page(None, 10)
+    assert [match.id for match in page] == [match.id for match in matches[-5:]]
+    assert cursor is None
+
+    # a cursor from before compaction lands in the right spot
+    page, _ = listing.page(97, 10)
+    assert [match.id for match in page] == ["m97", "m98", "m99"]
+
+
+def _request(operation: str, **params) -> str:
+    return json.dumps({"type": "request", "id": f"test-{operation}", "operation": operation, "params": params})
+
+
+async def _response(websocket) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(websocket.recv(), TIMEOUT))
+        if message["type"] == "response":
+            return message
+
+
+async def _lobby_notification(websocket) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(websocket.recv(), TIMEOUT))
+        if message["type"] == "notification":
+            return message
+
+
+async def _abandoned_match():
+    server = VimeraWebsocketsServer("127.0.0.1", 0)
+    server_task = asyncio.create_task(server.start())
+    await server.wait_until_ready()
+    uri = f"ws://127.0.0.1:{server.port}"
+    try:
+        async with websockets.client.connect(uri) as watcher, websockets.client.connect(uri) as joiner:
+            await watcher.send(_request("subscribe-lobby", game="p1wins"))
+            await _response(watcher)
+
+            async with websockets.client.connect(uri) as creator:
+                await creator.send(_request("create-match", game="p1wins", **{"player-name": "p1"}))
+                result = (await _response(creator))["result"]
+            match_id, session_token = result["match-id"], result["session-token"]
+            assert (await _lobby_notification(watcher))["event"] == "add"
+
+            # the creator is gone, so the match leaves the lobby
+            removed = await _lobby_notification(watcher)
+            assert removed["event"] == "remove"
+            await watcher.send(_request("list-matches", game="p1wins"))
+            assert (await _response(watcher))["result"]["matches"] == []
+
+            # and can't be joined into a match nobody would ever move in
+            await joiner.send(_request("join-match", **{"match-id": match_id, "player-name": "p2"}))
+            assert "error" in await _response(joiner)
+
+            async with websockets.client.connect(uri) as creator:
+                await creator.send(_request("resume-session", **{"session-token": session_token}))
+                assert "error" not in await _response(creator)
+                assert (await _lobby_notification(watcher))["event"] == "add"
+                await watcher.send(_request("list-matches", game="p1wins"))
+                listed = (await _response(watcher))["result"]["matches"]
+                assert [match["match-id"] for match in listed] == [match_id]
+
+                await joiner.send(_request("join-match", **{"match-id": match_id, "player-name": "p2"}))
+                assert "error" not in await _response(joiner)
+    finally:
+        server.stop()
+        await server_task
+
+
+def test_creator_leaving_unlists_the_match_until_they_resume():
+    asyncio.run(_abandoned_match())